@@ -0,0 +1,187 @@
+# filename: asset_cache.py
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from typing import IO, Optional, Tuple, Union
+
+from PIL import Image
+
+from memory_budget import BudgetedCache
+
+# 已解码的底图 / 置顶图层，计入全局内存预算
+_assets = BudgetedCache("assets")
+
+# 解码结果的磁盘缓存目录（位于素材所在目录下），文件名包含源文件的 SHA-1
+DISK_CACHE_DIR = ".asset_cache"
+
+# 磁盘缓存文件头：魔数、宽、高、不透明区域 bbox（无则为 -1），按 32 字节对齐
+_HEADER = struct.Struct("<4sII4i")
+_HEADER_SIZE = 32
+_MAGIC = b"RGBA"
+
+# 映射到内存的图像只计入名义大小：其页面属于文件缓存，可被系统回收并在多个进程间共享
+_MAPPED_CHARGE = 4096
+
+Box = Tuple[int, int, int, int]
+
+
+def _file_key(path: str) -> Tuple[str, float, int]:
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime, st.st_size
+
+
+def _file_sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _cache_file(path: str, digest: str) -> str:
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, DISK_CACHE_DIR, f"{name}.{digest}.rgba")
+
+
+def _opaque_bbox(img: Image.Image) -> Optional[Box]:
+    return img.getchannel("A").getbbox()
+
+
+def _map_cached(cache_file: str) -> Optional[Image.Image]:
+    """
+    以只读 mmap 方式打开磁盘缓存，像素直接引用映射的页面。
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mm) < _HEADER_SIZE:
+        mm.close()
+        return None
+    magic, w, h, *bbox = _HEADER.unpack_from(mm, 0)
+    if magic != _MAGIC or len(mm) != _HEADER_SIZE + w * h * 4:
+        mm.close()
+        return None
+    img = Image.frombuffer(
+        "RGBA", (w, h), memoryview(mm)[_HEADER_SIZE:], "raw", "RGBA", 0, 1
+    )
+    img.info["opaque_bbox"] = tuple(bbox) if bbox[0] >= 0 else None
+    return img
+
+
+def _write_cached(path: str, cache_file: str, img: Image.Image) -> None:
+    bbox = _opaque_bbox(img) or (-1, -1, -1, -1)
+    folder = os.path.dirname(cache_file)
+    tmp = None
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # 临时文件名在进程与线程间都唯一，写完后原子替换
+        fd, tmp = tempfile.mkstemp(
+            prefix=os.path.basename(cache_file) + ".", suffix=".tmp", dir=folder
+        )
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, img.width, img.height, *bbox))
+            f.write(bytes(_HEADER_SIZE - _HEADER.size))
+            f.write(img.tobytes())
+        os.replace(tmp, cache_file)
+    except OSError:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        return
+
+    # 清理同一素材旧版本的缓存（Windows 上仍被其他进程映射的文件会删除失败，忽略即可）
+    pattern = os.path.join(folder, glob.escape(os.path.basename(path)) + ".*.rgba")
+    for stale in glob.glob(pattern):
+        if stale != cache_file:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _decode(path: str) -> Tuple[Image.Image, bool]:
+    """
+    优先从磁盘缓存映射解码结果，否则解码 PNG 并写入缓存。
+
+    :return: (图像, 是否为内存映射)
+    """
+    try:
+        cache_file = _cache_file(path, _file_sha1(path))
+    except OSError:
+        cache_file = None
+
+    if cache_file is not None:
+        img = _map_cached(cache_file)
+        if img is not None:
+            return img, True
+
+    with Image.open(path) as src:
+        img = src.convert("RGBA")
+    img.info["opaque_bbox"] = _opaque_bbox(img)
+    if cache_file is not None:
+        _write_cached(path, cache_file, img)
+    return img, False
+
+
+def load_rgba(path: str) -> Image.Image:
+    """
+    读取并缓存解码后的 RGBA 图像。
+
+    解码结果同时保存在素材目录下的磁盘缓存中，之后的启动直接 mmap 映射，
+    不再解压 PNG。返回的是共享（可能只读）对象，调用方如需修改必须先 copy()。
+    """
+    key = _file_key(path)
+    img = _assets.get(key)
+    if img is None:
+        img, mapped = _decode(path)
+        _assets.put(key, img, _MAPPED_CHARGE if mapped else None)
+    return img
+
+
+def paste_overlay(img: Image.Image, overlay: Image.Image) -> None:
+    """
+    将置顶图层叠加到 img 上，只处理图层中不透明的区域。
+    """
+    if "opaque_bbox" in overlay.info:
+        bbox = overlay.info["opaque_bbox"]
+    else:
+        bbox = _opaque_bbox(overlay)
+    if bbox is None:
+        return
+    part = overlay.crop(bbox)
+    img.paste(part, bbox[:2], part)
+
+
+def load_overlay(path: Optional[str]) -> Optional[Image.Image]:
+    """
+    读取置顶图层，文件不存在时返回 None。
+    """
+    if not path or not os.path.isfile(path):
+        return None
+    return load_rgba(path)
+
+
+def open_canvas(image_source: Union[str, IO[bytes], Image.Image]) -> Image.Image:
+    """
+    打开底图并返回可修改的 RGBA 副本。
+    """
+    if isinstance(image_source, Image.Image):
+        return image_source.copy()
+    if isinstance(image_source, str):
+        return load_rgba(image_source).copy()
+    return Image.open(image_source).convert("RGBA")
+
+
+def open_overlay(image_overlay: Union[str, Image.Image, None]) -> Optional[Image.Image]:
+    """
+    打开置顶图层；未指定或文件不存在时返回 None。
+    """
+    if image_overlay is None:
+        return None
+    if isinstance(image_overlay, Image.Image):
+        return image_overlay.copy()
+    return load_overlay(image_overlay)
@@ -1,82 +1,130 @@
+import hashlib
+import json
 import os
-import yaml
-from typing import Dict, Any, Tuple, List
-from pydantic import BaseModel
-
-
-class Config(BaseModel):
-    """配置模型类"""
-    hotkey: str = "enter"
-    """全局热键, 用于 keyboard 库"""
-    allowed_processes: List[str] = []
-    """允许的进程列表"""
-    select_all_hotkey: str = "ctrl+a"
-    """全选快捷键"""
-    cut_hotkey: str = "ctrl+x"
-    """剪切快捷键"""
-    paste_hotkey: str = "ctrl+v"
-    """黏贴快捷键"""
-    send_hotkey: str = "enter"
-    """发送消息快捷键"""
-    block_hotkey: bool = False
-    """阻塞热键"""
-    delay: float = 0.1
-    """操作延时（秒）"""
-    font_file: str = "font.ttf"
-    """字体文件路径"""
-    baseimage_mapping: Dict[str, str] = {
-        "#普通#": "BaseImages\\base.png"
-    }
-    """差分表情映射字典"""
-    baseimage_file: str = "BaseImages\\base.png"
-    """默认底图文件路径"""
-    text_box_topleft: Tuple[int, int] = (119, 450)
-    """文本框左上角坐标"""
-    image_box_bottomright: Tuple[int, int] = (398, 625)
-    """文本框右下角坐标"""
-    base_overlay_file: str = "BaseImages\\base_overlay.png"
-    """底图置顶图层文件路径"""
-    use_base_overlay: bool = True
-    """是否使用底图置顶图层"""
-    auto_paste_image: bool = True
-    """是否自动黏贴图片"""
-    auto_send_image: bool = True
-    """是否自动发送图片"""
-    logging_level: str = "INFO"
-    """日志记录等级"""
-    emotion_switch_hotkeys: Dict[str, str] = {
-        "alt+1": "#普通#"
-    }
-    """表情切换快捷键映射"""
-
-    class Config:
-        arbitrary_types_allowed = True
-
-
-def load_config(config_file: str = "config.yaml") -> Config:
+from typing import Any, Dict, Optional, Union
+
+# 校验后配置的快照文件名，与 config.yaml 放在同一目录
+SNAPSHOT_FILE = ".config_cache.json"
+
+# 需要从列表还原为元组的字段
+_TUPLE_FIELDS = (
+    "text_box_topleft",
+    "image_box_bottomright",
+    "text_outline_color",
+    "text_shadow_offset",
+    "text_shadow_color",
+)
+
+_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_model.py")
+
+
+class ConfigSnapshot:
     """
-    从YAML文件加载配置
-    
-    Args:
-        config_file: 配置文件路径
-        
-    Returns:
-        Config: 配置对象
+    从快照恢复的配置对象，属性与 Config 相同。
+
+    快照中的数据已经过 Config 校验，因此这里不再导入 pydantic。
     """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        for key in _TUPLE_FIELDS:
+            if isinstance(data.get(key), list):
+                data[key] = tuple(data[key])
+        self.__dict__.update(data)
+
+    def __repr__(self) -> str:
+        return f"ConfigSnapshot({self.__dict__!r})"
+
+
+def __getattr__(name: str) -> Any:
+    # 兼容 `from config_loader import Config`，同时避免启动时导入 pydantic
+    if name == "Config":
+        from config_model import Config
+
+        return Config
+    raise AttributeError(name)
+
+
+def _digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _snapshot_path(config_file: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), SNAPSHOT_FILE)
+
+
+def _snapshot_key(config_file: str) -> str:
+    # 配置文件和配置模型任一变化都会使快照失效
+    return f"{_digest(config_file)}:{_digest(_MODEL_FILE)}"
+
+
+def _read_snapshot(config_file: str) -> Optional[ConfigSnapshot]:
+    try:
+        with open(_snapshot_path(config_file), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("key") != _snapshot_key(config_file):
+        return None
+    return ConfigSnapshot(snapshot["data"])
+
+
+def _write_snapshot(config_file: str, config: Any) -> None:
+    dump = getattr(config, "model_dump", None) or config.dict
+    snapshot = {"key": _snapshot_key(config_file), "data": dump()}
+    try:
+        with open(_snapshot_path(config_file), "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+    except OSError:
+        pass
+
+
+def _validate_config(config_file: str) -> Any:
+    import yaml
+
+    from config_model import Config
+
     # 如果配置文件不存在，使用默认配置
     if not os.path.exists(config_file):
         return Config()
-    
+
     # 读取YAML配置文件
     with open(config_file, 'r', encoding='utf-8') as f:
         config_data = yaml.safe_load(f)
-    
+
     # 处理坐标值，确保它们是元组而不是列表
-    if 'text_box_topleft' in config_data and isinstance(config_data['text_box_topleft'], list):
-        config_data['text_box_topleft'] = tuple(config_data['text_box_topleft'])
-    
-    if 'image_box_bottomright' in config_data and isinstance(config_data['image_box_bottomright'], list):
-        config_data['image_box_bottomright'] = tuple(config_data['image_box_bottomright'])
-    
+    for key in _TUPLE_FIELDS:
+        if key in config_data and isinstance(config_data[key], list):
+            config_data[key] = tuple(config_data[key])
+
     # 创建并返回配置对象
-    return Config(**config_data)
\ No newline at end of file
+    return Config(**config_data)
+
+
+def load_config(
+    config_file: str = "config.yaml", use_snapshot: bool = True
+) -> Union["Config", ConfigSnapshot]:  # noqa: F821
+    """
+    从YAML文件加载配置
+
+    config.yaml 未变化时直接读取上次校验结果的快照，跳过 YAML 解析与 pydantic 校验。
+
+    Args:
+        config_file: 配置文件路径
+        use_snapshot: 是否使用快照
+
+    Returns:
+        Config | ConfigSnapshot: 配置对象
+    """
+    if use_snapshot and os.path.exists(config_file):
+        snapshot = _read_snapshot(config_file)
+        if snapshot is not None:
+            return snapshot
+
+    config = _validate_config(config_file)
+    if use_snapshot and os.path.exists(config_file):
+        _write_snapshot(config_file, config)
+    return config
@@ -0,0 +1,99 @@
+from typing import Dict, Tuple, List
+from pydantic import BaseModel
+
+
+class Config(BaseModel):
+    """配置模型类"""
+    hotkey: str = "enter"
+    """全局热键, 用于 keyboard 库"""
+    allowed_processes: List[str] = []
+    """允许的进程列表"""
+    select_all_hotkey: str = "ctrl+a"
+    """全选快捷键"""
+    cut_hotkey: str = "ctrl+x"
+    """剪切快捷键"""
+    paste_hotkey: str = "ctrl+v"
+    """黏贴快捷键"""
+    send_hotkey: str = "enter"
+    """发送消息快捷键"""
+    block_hotkey: bool = False
+    """阻塞热键"""
+    delay: float = 0.1
+    """操作延时（秒）"""
+    font_file: str = "font.ttf"
+    """字体文件路径"""
+    fallback_fonts: List[str] = []
+    """回退字体文件路径列表，主字体缺字时按顺序选用"""
+    baseimage_mapping: Dict[str, str] = {
+        "#普通#": "BaseImages\\base.png"
+    }
+    """差分表情映射字典"""
+    baseimage_file: str = "BaseImages\\base.png"
+    """默认底图文件路径"""
+    text_box_topleft: Tuple[int, int] = (119, 450)
+    """文本框左上角坐标"""
+    image_box_bottomright: Tuple[int, int] = (398, 625)
+    """文本框右下角坐标"""
+    base_overlay_file: str = "BaseImages\\base_overlay.png"
+    """底图置顶图层文件路径"""
+    use_base_overlay: bool = True
+    """是否使用底图置顶图层"""
+    auto_paste_image: bool = True
+    """是否自动黏贴图片"""
+    auto_send_image: bool = True
+    """是否自动发送图片"""
+    logging_level: str = "INFO"
+    """日志记录等级"""
+    emotion_switch_hotkeys: Dict[str, str] = {
+        "alt+1": "#普通#"
+    }
+    """表情切换快捷键映射"""
+    preview_hotkey: str = ""
+    """预览当前内容在所有差分上效果的快捷键，留空表示不注册"""
+    resend_hotkey: str = ""
+    """重发最近一次发送内容的快捷键，留空表示不注册"""
+    history_size: int = 10
+    """保存的发送历史条数，0 表示不保存"""
+    history_max_mb: float = 16
+    """发送历史中图片的总大小上限（MB），超出时淘汰最旧的记录"""
+    process_cache_ttl: float = 2.0
+    """前台进程判断与进程名缓存有效期（秒），期间同一窗口不查询进程信息"""
+    resident_mode: bool = False
+    """常驻模式：不缓存整张渲染结果，降低常驻内存"""
+    trace_allocations: bool = False
+    """开启 tracemalloc，在内存报告中按子系统统计分配量（会增加每次分配的开销）"""
+    memory_budget_mb: float = 64
+    """所有缓存共享的内存预算（MB）"""
+    memory_report_interval: float = 0
+    """定期输出内存报告的间隔（秒），0 表示关闭"""
+    memory_report_hotkey: str = ""
+    """按需输出内存报告的快捷键，留空表示不注册"""
+    animated_output: str = ""
+    """纯文本时输出打字机动图的格式："gif"、"apng"，留空表示输出静态 PNG"""
+    animation_frames: int = 30
+    """动图中文字出现过程的帧数"""
+    animation_frame_duration: int = 60
+    """动图每帧时长（毫秒）"""
+    pagination_mode: str = ""
+    """长文本分页方式："sequence" 逐页发送、"stack" 拼接为一张，留空表示不分页"""
+    min_font_size: int = 16
+    """分页模式下的最小字号"""
+    trim_pasted_image: bool = False
+    """粘贴图片前裁掉四周的纯色边距"""
+    trim_tolerance: int = 16
+    """裁边时判断为边框颜色的最大色差（0~255）"""
+    text_outline_width: int = 0
+    """文字描边宽度（像素），0 表示不描边"""
+    text_outline_color: Tuple[int, int, int] = (255, 255, 255)
+    """文字描边颜色"""
+    text_shadow_offset: Tuple[int, int] = (2, 2)
+    """文字投影偏移 (x, y)"""
+    text_shadow_blur: int = 2
+    """文字投影模糊半径（像素）"""
+    text_shadow_color: Tuple[int, int, int] = (0, 0, 0)
+    """文字投影颜色"""
+    text_shadow_opacity: float = 0.0
+    """文字投影不透明度（0~1），0 表示不投影"""
+
+    class Config:
+        arbitrary_types_allowed = True
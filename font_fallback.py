@@ -0,0 +1,278 @@
+# filename: font_fallback.py
+import hashlib
+import json
+import os
+import struct
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import ImageFont
+
+# 码位覆盖表的磁盘缓存目录，文件名为字体文件内容的 SHA-1
+COVERAGE_CACHE_DIR = ".font_cache"
+
+# (起始码位, 结束码位)，闭区间
+CodeRange = Tuple[int, int]
+
+# cmap 子表的选择优先级：(platformID, encodingID)
+_CMAP_PREFERENCE = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+
+
+def _merge_ranges(ranges: List[CodeRange]) -> List[CodeRange]:
+    merged: List[CodeRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _format4_ranges(data: bytes, off: int) -> List[CodeRange]:
+    seg_count = struct.unpack_from(">H", data, off + 6)[0] // 2
+    ends_off = off + 14
+    starts_off = ends_off + seg_count * 2 + 2
+    deltas_off = starts_off + seg_count * 2
+    range_offs_off = deltas_off + seg_count * 2
+
+    codes: List[CodeRange] = []
+    for i in range(seg_count):
+        end = struct.unpack_from(">H", data, ends_off + i * 2)[0]
+        start = struct.unpack_from(">H", data, starts_off + i * 2)[0]
+        delta = struct.unpack_from(">h", data, deltas_off + i * 2)[0]
+        range_off = struct.unpack_from(">H", data, range_offs_off + i * 2)[0]
+        if start == 0xFFFF:
+            continue
+        if range_off == 0:
+            # 仅当映射结果为字形 0 时视为缺字
+            for c in range(start, end + 1):
+                if (c + delta) & 0xFFFF:
+                    codes.append((c, c))
+            continue
+        for c in range(start, end + 1):
+            pos = range_offs_off + i * 2 + range_off + (c - start) * 2
+            if pos + 2 > len(data):
+                break
+            glyph = struct.unpack_from(">H", data, pos)[0]
+            if glyph and (glyph + delta) & 0xFFFF:
+                codes.append((c, c))
+    return _merge_ranges(codes)
+
+
+def _format12_ranges(data: bytes, off: int) -> List[CodeRange]:
+    n_groups = struct.unpack_from(">I", data, off + 12)[0]
+    ranges: List[CodeRange] = []
+    for i in range(n_groups):
+        start, end, start_glyph = struct.unpack_from(">III", data, off + 16 + i * 12)
+        if start_glyph == 0:
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return _merge_ranges(ranges)
+
+
+def read_cmap_ranges(data: bytes, font_index: int = 0) -> List[CodeRange]:
+    """
+    从 TrueType / OpenType（含 TTC）字体数据的 cmap 表中读取有字形的码位区间。
+
+    仅解析常用的 format 4 与 format 12 子表；无法解析时返回空列表。
+    """
+    base = 0
+    if data[:4] == b"ttcf":
+        base = struct.unpack_from(">I", data, 12 + 4 * font_index)[0]
+    num_tables = struct.unpack_from(">H", data, base + 4)[0]
+
+    cmap_off = None
+    for i in range(num_tables):
+        rec = base + 12 + 16 * i
+        if data[rec : rec + 4] == b"cmap":
+            cmap_off = struct.unpack_from(">I", data, rec + 8)[0]
+            break
+    if cmap_off is None:
+        return []
+
+    n_sub = struct.unpack_from(">H", data, cmap_off + 2)[0]
+    subtables: Dict[Tuple[int, int], int] = {}
+    for i in range(n_sub):
+        platform, encoding, sub_off = struct.unpack_from(
+            ">HHI", data, cmap_off + 4 + i * 8
+        )
+        subtables.setdefault((platform, encoding), cmap_off + sub_off)
+
+    for key in _CMAP_PREFERENCE:
+        off = subtables.get(key)
+        if off is None:
+            continue
+        fmt = struct.unpack_from(">H", data, off)[0]
+        if fmt == 12:
+            return _format12_ranges(data, off)
+        if fmt == 4:
+            return _format4_ranges(data, off)
+    return []
+
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_coverage(path: str, cache_dir: str = COVERAGE_CACHE_DIR) -> List[CodeRange]:
+    """
+    获取字体的码位覆盖区间，结果按字体文件哈希缓存到磁盘。
+    """
+    digest = _file_sha1(path)
+    cache_file = os.path.join(cache_dir, digest + ".json")
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return [tuple(r) for r in json.load(f)]  # type: ignore
+    except (OSError, ValueError):
+        pass
+
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        ranges = read_cmap_ranges(data)
+    except struct.error:
+        ranges = []
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(ranges, f)
+    except OSError:
+        pass
+    return ranges
+
+
+class FontChain:
+    """
+    字体回退链：每个码位交给链中第一个包含该字形的字体。
+
+    构建时把各字体的覆盖区间合并为一张互不重叠的 码位区间 → 字体序号 表，
+    之后每个字符只需一次二分查找。
+    """
+
+    def __init__(self, paths: Sequence[str], cache_dir: str = COVERAGE_CACHE_DIR) -> None:
+        self.paths = tuple(paths)
+        covered: List[CodeRange] = []
+        entries: List[Tuple[int, int, int]] = []
+        for index, path in enumerate(self.paths):
+            if not os.path.isfile(path):
+                continue
+            ranges = load_coverage(path, cache_dir)
+            for part in _subtract(ranges, covered):
+                entries.append((part[0], part[1], index))
+            covered = _merge_ranges(covered + ranges)
+        entries.sort()
+        self._starts = [e[0] for e in entries]
+        self._entries = entries
+        self._memo: Dict[str, int] = {}
+
+    def font_index(self, ch: str) -> Optional[int]:
+        """
+        返回覆盖该字符的字体序号，没有字体覆盖时返回 None。
+        """
+        index = self._memo.get(ch, -1)
+        if index != -1:
+            return index
+        cp = ord(ch)
+        i = bisect_right(self._starts, cp) - 1
+        found = None
+        if i >= 0:
+            start, end, font = self._entries[i]
+            if start <= cp <= end:
+                found = font
+        self._memo[ch] = found
+        return found
+
+    def segment(self, text: str) -> List[Tuple[str, int]]:
+        """
+        将文本切分为 (片段, 字体序号) 的连续字体片段。
+
+        空白字符跟随前一个片段；没有字体覆盖的字符交给主字体（序号 0）。
+        """
+        runs: List[Tuple[str, int]] = []
+        buf = ""
+        current = 0
+        for ch in text:
+            if ch.isspace() and buf:
+                buf += ch
+                continue
+            index = self.font_index(ch)
+            if index is None:
+                index = 0
+            if buf and index != current:
+                runs.append((buf, current))
+                buf = ""
+            current = index
+            buf += ch
+        if buf:
+            runs.append((buf, current))
+        return runs
+
+
+def _subtract(ranges: List[CodeRange], covered: List[CodeRange]) -> List[CodeRange]:
+    """
+    返回 ranges 中不被 covered 覆盖的部分（两者均已排序且互不重叠）。
+    """
+    out: List[CodeRange] = []
+    j = 0
+    for start, end in ranges:
+        cur = start
+        while j < len(covered) and covered[j][1] < cur:
+            j += 1
+        k = j
+        while k < len(covered) and covered[k][0] <= end and cur <= end:
+            if covered[k][0] > cur:
+                out.append((cur, covered[k][0] - 1))
+            cur = max(cur, covered[k][1] + 1)
+            k += 1
+        if cur <= end:
+            out.append((cur, end))
+    return out
+
+
+_chains: Dict[Tuple[str, ...], FontChain] = {}
+_chains_lock = threading.Lock()
+
+
+def get_chain(paths: Sequence[str]) -> FontChain:
+    """
+    获取（并缓存）指定字体路径序列的回退链。
+    """
+    key = tuple(paths)
+    with _chains_lock:
+        chain = _chains.get(key)
+        if chain is None:
+            chain = FontChain(key)
+            _chains[key] = chain
+        return chain
+
+
+class FallbackFont:
+    """
+    某一字号下的回退字体组合，可代替单个字体传给 text_fit_draw 中的排版函数。
+    """
+
+    def __init__(self, chain: FontChain, fonts: List[ImageFont.FreeTypeFont], size: int) -> None:
+        self.chain = chain
+        self.fonts = fonts
+        self.size = size
+        self.path = "|".join(chain.paths)
+        metrics = [f.getmetrics() for f in fonts]
+        self.ascent = max(m[0] for m in metrics)
+        self.descent = max(m[1] for m in metrics)
+
+    def getmetrics(self) -> Tuple[int, int]:
+        return self.ascent, self.descent
+
+    def runs(self, text: str) -> List[Tuple[str, ImageFont.FreeTypeFont]]:
+        """
+        将文本切分为 (片段, 字体) 列表。
+        """
+        return [(seg, self.fonts[i]) for seg, i in self.chain.segment(text)]
@@ -1,13 +1,18 @@
 # filename: image_fit_paste.py
-import os
+import math
 from io import BytesIO
-from typing import Literal, Tuple, Union
+from typing import Literal, Optional, Tuple, Union
 
-from PIL import Image
+from PIL import Image, ImageChops
+
+from asset_cache import open_canvas, open_overlay, paste_overlay
 
 Align = Literal["left", "center", "right"]
 VAlign = Literal["top", "middle", "bottom"]
 
+# Image.reduce 支持的模式
+_REDUCIBLE_MODES = ("L", "LA", "La", "RGB", "RGBA", "RGBa", "I", "F")
+
 
 def paste_image_auto(
     image_source: Union[str, Image.Image],
@@ -21,6 +26,42 @@ def paste_image_auto(
     keep_alpha: bool = True,
     image_overlay: Union[str, Image.Image, None] = None,
 ) -> bytes:
+    """
+    在指定矩形内放置一张图片，参数同 render_pasted_image。
+
+    返回：最终 PNG 的 bytes。
+    """
+    img = render_pasted_image(
+        image_source,
+        top_left,
+        bottom_right,
+        content_image,
+        align,
+        valign,
+        padding,
+        allow_upscale,
+        keep_alpha,
+        image_overlay,
+    )
+
+    # 输出 PNG bytes
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def render_pasted_image(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    content_image: Image.Image,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    padding: int = 0,
+    allow_upscale: bool = False,
+    keep_alpha: bool = True,
+    image_overlay: Union[str, Image.Image, None] = None,
+) -> Image.Image:
     """
     在指定矩形内放置一张图片（content_image），按比例缩放至“最大但不超过”该矩形。
 
@@ -35,27 +76,14 @@ def paste_image_auto(
     : param keep_alpha: True 时保留透明通道并用其作为粘贴蒙版
     : param image_overlay: 可选的置顶覆盖图（会被复制，原图不改）
 
-    返回：最终 PNG 的 bytes。
+    返回：未编码的结果图像。
     """
     if not isinstance(content_image, Image.Image):
         raise TypeError("content_image 必须为 PIL.Image.Image")
 
-    if isinstance(image_source, Image.Image):
-        img = image_source.copy()
-    else:
-        img = Image.open(image_source).convert("RGBA")
-
-    if image_overlay is not None:
-        if isinstance(image_overlay, Image.Image):
-            img_overlay = image_overlay.copy()
-        else:
-            img_overlay = (
-                Image.open(image_overlay).convert("RGBA")
-                if os.path.isfile(image_overlay)
-                else None
-            )
-    else:
-        img_overlay = None
+    img = open_canvas(image_source)
+
+    img_overlay = open_overlay(image_overlay)
 
     x1, y1 = top_left
     x2, y2 = bottom_right
@@ -109,11 +137,109 @@ def paste_image_auto(
 
     # 覆盖置顶图层（如果有）
     if image_overlay is not None and img_overlay is not None:
-        img.paste(img_overlay, (0, 0), img_overlay)
+        paste_overlay(img, img_overlay)
     elif image_overlay is not None and img_overlay is None:
         print("Warning: overlay image is not exist.")
 
-    # 输出 PNG bytes
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
+    return img
+
+
+def prescale_image(
+    content_image: Image.Image, max_w: int, max_h: int, oversample: int = 2
+) -> Image.Image:
+    """
+    预先解码并用整数倍盒式缩小（reduce）超大的图片，使其不超过目标区域的 oversample 倍。
+
+    最终的 LANCZOS 缩放仍由 paste_image_auto 完成，这里只是把大截图的像素量降下来。
+    缩小倍数由缩放比例较大的一边决定，因此长截图同样会被缩小。
+    """
+    content_image.load()
+    factor = max(
+        math.ceil(content_image.width / max(1, max_w)),
+        math.ceil(content_image.height / max(1, max_h)),
+    ) // max(1, oversample)
+    if factor < 2:
+        return content_image
+    if content_image.mode not in _REDUCIBLE_MODES:
+        # reduce 不支持调色板等模式，先转换为真彩色
+        has_alpha = "A" in content_image.getbands() or "transparency" in content_image.info
+        content_image = content_image.convert("RGBA" if has_alpha else "RGB")
+    return content_image.reduce(factor)
+
+
+def _border_color(proxy: Image.Image) -> Optional[Tuple[int, ...]]:
+    """
+    返回四条边上出现最多的颜色；该颜色不足边缘像素的一半时返回 None（没有统一的边框）。
+    """
+    w, h = proxy.size
+    edges = [
+        proxy.crop((0, 0, w, 1)),
+        proxy.crop((0, h - 1, w, h)),
+        proxy.crop((0, 0, 1, h)).rotate(90, expand=True),
+        proxy.crop((w - 1, 0, w, h)).rotate(90, expand=True),
+    ]
+    strip = Image.new(proxy.mode, (2 * (w + h), 1))
+    x = 0
+    for edge in edges:
+        strip.paste(edge, (x, 0))
+        x += edge.width
+
+    colors = strip.getcolors(strip.width)
+    if not colors:
+        return None
+    count, color = max(colors, key=lambda c: c[0])
+    if count * 2 < strip.width:
+        return None
+    return color if isinstance(color, tuple) else (color,)
+
+
+def trim_borders(
+    content_image: Image.Image, tolerance: int = 16, proxy_size: int = 256
+) -> Image.Image:
+    """
+    裁掉图片四周与边框颜色相近的纯色边距（聊天背景、窗口边框等）。
+
+    在长边不超过 proxy_size 的缩小副本上，与边缘主色逐像素求差并按 tolerance 阈值化，
+    再用 getbbox 得到内容范围，最后映射回原图裁剪。没有统一边框或裁剪后为空时返回原图。
+
+    : param tolerance: 各通道允许的最大色差（0~255）
+    : param proxy_size: 检测用缩小副本的最大边长
+    """
+    content_image.load()
+    w, h = content_image.size
+    if w < 3 or h < 3:
+        return content_image
+
+    proxy = content_image
+    if proxy.mode not in ("RGB", "RGBA", "L"):
+        proxy = proxy.convert("RGBA")
+    factor = max(1, max(w, h) // proxy_size)
+    if factor > 1:
+        proxy = proxy.reduce(factor)
+
+    border = _border_color(proxy)
+    if border is None:
+        return content_image
+
+    if proxy.mode == "RGBA" and border[3] == 0:
+        # 透明边框：只看透明度
+        diff = proxy.getchannel("A")
+    else:
+        diff = ImageChops.difference(proxy, Image.new(proxy.mode, proxy.size, border))
+        bands = diff.split()
+        diff = bands[0]
+        for band in bands[1:]:
+            diff = ImageChops.lighter(diff, band)
+    bbox = diff.point(lambda v: 255 if v > tolerance else 0).getbbox()
+    if bbox is None:
+        return content_image
+
+    # 映射回原图坐标，并多保留一个缩小像素以免切到内容边缘
+    sx, sy = w / proxy.width, h / proxy.height
+    left = max(0, int((bbox[0] - 1) * sx))
+    top = max(0, int((bbox[1] - 1) * sy))
+    right = min(w, int((bbox[2] + 1) * sx + 0.5))
+    bottom = min(h, int((bbox[3] + 1) * sy + 0.5))
+    if (left, top, right, bottom) == (0, 0, w, h):
+        return content_image
+    return content_image.crop((left, top, right, bottom))
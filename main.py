@@ -1,20 +1,20 @@
 # hotkey_demo.py
-import io
-import logging
+from __future__ import annotations
+
 import time
-from typing import Optional, Tuple
 
-import keyboard
-import psutil
-import pyperclip
-import win32clipboard
-import win32gui
-import win32process
-from PIL import Image
+_start_time = time.perf_counter()
+
+import io  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+from typing import List, Optional, Tuple, Union  # noqa: E402
 
-from config_loader import load_config
-from image_fit_paste import paste_image_auto
-from text_fit_draw import draw_text_auto
+import keyboard  # noqa: E402
+
+from config_loader import load_config  # noqa: E402
 
 config = load_config()
 
@@ -23,45 +23,198 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
-# 当前使用的表情索引
+# 当前使用的表情，热键线程与表情切换快捷键都会修改，读写需持有锁
 current_emotion = "#普通#"
-last_used_image_file = config.baseimage_mapping[current_emotion]
-ratio = 1
-
-# 注册表情切换快捷键
-def register_emotion_switch_hotkeys():
-    """注册表情切换快捷键"""
-    def switch_emotion(emotion_tag):
-        global current_emotion, last_used_image_file
-        current_emotion = emotion_tag
-        last_used_image_file = config.baseimage_mapping.get(emotion_tag, config.baseimage_file)
-        logging.info(f"已切换到表情: {emotion_tag} ({last_used_image_file})")
-    
-    for hotkey, emotion_tag in config.emotion_switch_hotkeys.items():
-        # 为每个表情快捷键绑定切换函数
-        keyboard.add_hotkey(hotkey, switch_emotion, args=(emotion_tag,), suppress=False)
+_emotion_lock = threading.Lock()
 
+# 主字体与回退字体链（有回退字体时按码位覆盖表逐字选择字体）
+font_source = (
+    (config.font_file, *config.fallback_fonts)
+    if config.fallback_fonts
+    else config.font_file
+)
 
-def is_vertical_image(image: Image.Image) -> bool:
+# 以下对象依赖 PIL / psutil / pyperclip / win32 等较重的模块，
+# 不在热键绑定的关键路径上，由 init_runtime() 在后台线程中加载
+Image = None
+pyperclip = None
+win32clipboard = None
+renderer = None
+render_style = None
+RenderRequest = None
+draw_text_animated = None
+draw_text_paginated = None
+stack_pages = None
+prescale_image = None
+trim_borders = None
+load_rgba = None
+load_overlay = None
+load_font = None
+prep_pool = None
+render_text_preview_sheet = None
+render_emotion_previews = None
+build_contact_sheet = None
+encode_sheet = None
+memory_report = None
+render_cache = None
+send_history = None
+process_guard = None
+
+_runtime_lock = threading.Lock()
+_runtime_ready = False
+
+
+def init_runtime():
     """
-    判断图像是否为竖图
+    加载渲染与剪贴板相关的模块并创建缓存，可重复调用。
     """
-    return image.height * ratio > image.width
+    global Image, pyperclip, win32clipboard, renderer, render_style, RenderRequest
+    global draw_text_animated, draw_text_paginated, stack_pages
+    global prescale_image, trim_borders, load_rgba, load_overlay, load_font, prep_pool
+    global render_text_preview_sheet, render_emotion_previews
+    global build_contact_sheet, encode_sheet
+    global memory_report, render_cache, send_history, process_guard
+    global _runtime_ready
+
+    with _runtime_lock:
+        if _runtime_ready:
+            return
+        t0 = time.perf_counter()
+
+        import tracemalloc
+        from concurrent.futures import ThreadPoolExecutor
+
+        import pyperclip as _pyperclip
+        import win32clipboard as _win32clipboard
+        from PIL import Image as _Image
+
+        from asset_cache import load_overlay as _load_overlay
+        from asset_cache import load_rgba as _load_rgba
+        from image_fit_paste import prescale_image as _prescale_image
+        from image_fit_paste import trim_borders as _trim_borders
+        from memory_budget import (
+            BudgetedCache,
+            MemoryReporter,
+            configure_budget,
+        )
+        from memory_budget import memory_report as _memory_report
+        from preview_sheet import build_contact_sheet as _build_contact_sheet
+        from preview_sheet import encode_sheet as _encode_sheet
+        from preview_sheet import render_emotion_previews as _render_emotion_previews
+        from preview_sheet import (
+            render_text_preview_sheet as _render_text_preview_sheet,
+        )
+        from process_resolver import ForegroundProcessGuard
+        from renderer import Renderer, RenderStyle
+        from renderer import RenderRequest as _RenderRequest
+        from send_history import SendHistory
+        from text_effects import TextEffects
+        from text_animation import draw_text_animated as _draw_text_animated
+        from text_fit_draw import load_font as _load_font
+        from text_pagination import draw_text_paginated as _draw_text_paginated
+        from text_pagination import stack_pages as _stack_pages
+
+        Image = _Image
+        pyperclip = _pyperclip
+        win32clipboard = _win32clipboard
+        RenderRequest = _RenderRequest
+        draw_text_animated = _draw_text_animated
+        draw_text_paginated = _draw_text_paginated
+        stack_pages = _stack_pages
+        prescale_image = _prescale_image
+        trim_borders = _trim_borders
+        load_rgba = _load_rgba
+        load_overlay = _load_overlay
+        load_font = _load_font
+        render_text_preview_sheet = _render_text_preview_sheet
+        render_emotion_previews = _render_emotion_previews
+        build_contact_sheet = _build_contact_sheet
+        encode_sheet = _encode_sheet
+
+        # 在剪切等待期间执行与文本无关的预处理
+        prep_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prep")
+        memory_report = _memory_report
+
+        # 全局内存预算（字体、底图、渲染结果、字形测量共享）
+        configure_budget(config.memory_budget_mb)
+        if config.trace_allocations:
+            tracemalloc.start()
+
+        # 可在多线程中并发使用的渲染核心
+        renderer = Renderer(config.baseimage_mapping, config.baseimage_file)
+        render_style = RenderStyle(
+            font_path=font_source,
+            overlay=config.base_overlay_file if config.use_base_overlay else None,
+            effects=TextEffects(
+                outline_width=config.text_outline_width,
+                outline_color=config.text_outline_color,
+                shadow_offset=config.text_shadow_offset,
+                shadow_blur=config.text_shadow_blur,
+                shadow_color=config.text_shadow_color,
+                shadow_opacity=config.text_shadow_opacity,
+            ),
+        )
 
+        # 纯文本渲染结果缓存：(文本, 底图) -> PNG 字节
+        render_cache = BudgetedCache("renders")
 
-def get_foreground_window_process_name() -> Optional[str]:
+        # 发送历史：只保存渲染输入，图片按内容去重
+        send_history = SendHistory(
+            config.history_size, int(config.history_max_mb * 1024 * 1024)
+        )
+
+        # 前台进程检查（pid → 进程名与允许判断均带缓存）
+        process_guard = ForegroundProcessGuard(
+            config.allowed_processes, ttl=config.process_cache_ttl
+        )
+
+        if config.memory_report_interval > 0:
+            MemoryReporter(config.memory_report_interval).start()
+
+        _runtime_ready = True
+        logging.info("渲染模块加载完成，耗时 %.1f ms", (time.perf_counter() - t0) * 1000)
+
+
+class StageTimer:
     """
-    获取当前前台窗口的进程名称
+    记录单次按键各阶段的耗时
     """
-    try:
-        hwnd = win32gui.GetForegroundWindow()
-        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        process = psutil.Process(pid)
-        return process.name().lower()
 
-    except Exception as e:
-        logging.error(f"无法获取当前进程名称: {e}")
-        return None
+    def __init__(self):
+        self._last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.stages.append((name, (now - self._last) * 1000))
+        self._last = now
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {ms:.1f} ms" for name, ms in self.stages)
+
+
+def get_current_emotion() -> str:
+    with _emotion_lock:
+        return current_emotion
+
+
+def set_current_emotion(emotion_tag: str):
+    global current_emotion
+    with _emotion_lock:
+        current_emotion = emotion_tag
+
+
+# 注册表情切换快捷键
+def register_emotion_switch_hotkeys():
+    """注册表情切换快捷键"""
+    def switch_emotion(emotion_tag):
+        set_current_emotion(emotion_tag)
+        image_file = config.baseimage_mapping.get(emotion_tag, config.baseimage_file)
+        logging.info(f"已切换到表情: {emotion_tag} ({image_file})")
+
+    for hotkey, emotion_tag in config.emotion_switch_hotkeys.items():
+        # 为每个表情快捷键绑定切换函数
+        keyboard.add_hotkey(hotkey, switch_emotion, args=(emotion_tag,), suppress=False)
 
 
 def copy_png_bytes_to_clipboard(png_bytes: bytes):
@@ -74,6 +227,7 @@ def copy_png_bytes_to_clipboard(png_bytes: bytes):
     with io.BytesIO() as output:
         image.convert("RGB").save(output, "BMP")
         bmp_data = output.getvalue()[14:]
+    image.close()
 
     # 打开剪贴板并写入 DIB 格式
     win32clipboard.OpenClipboard()
@@ -82,6 +236,20 @@ def copy_png_bytes_to_clipboard(png_bytes: bytes):
     win32clipboard.CloseClipboard()
 
 
+def copy_file_to_clipboard(path: str):
+    """
+    将文件以 CF_HDROP 格式复制到剪贴板（用于 GIF / APNG 等动图）
+    """
+    # DROPFILES 结构：pFiles=20, pt=(0, 0), fNC=0, fWide=1，随后是以双 NUL 结尾的宽字符路径列表
+    dropfiles = (20).to_bytes(4, "little") + bytes(12) + (1).to_bytes(4, "little")
+    data = dropfiles + (os.path.abspath(path) + "\0\0").encode("utf-16-le")
+
+    win32clipboard.OpenClipboard()
+    win32clipboard.EmptyClipboard()
+    win32clipboard.SetClipboardData(win32clipboard.CF_HDROP, data)
+    win32clipboard.CloseClipboard()
+
+
 def cut_all_and_get_text() -> Tuple[str, str]:
     """
     模拟 Ctrl+A / Ctrl+X 剪切用户输入的全部文本，并返回剪切得到的内容和原始剪贴板的文本内容。
@@ -146,47 +314,140 @@ def try_get_image() -> Optional[Image.Image]:
     return image
 
 
-def process_text_and_image(text: str, image: Optional[Image.Image]) -> Optional[bytes]:
+def make_request(
+    text: str, image: Optional[Image.Image], emotion: str
+) -> RenderRequest:
+    """
+    按配置构造渲染请求
+    """
+    x1, y1 = config.text_box_topleft
+    x2, y2 = config.image_box_bottomright
+    return RenderRequest(text, image, emotion, (x1, y1, x2, y2), render_style)
+
+
+def process_text_and_image(
+    text: str, image: Optional[Image.Image], emotion: Optional[str] = None
+) -> Optional[bytes]:
     """
     同时处理文本和图像内容，将其绘制到同一张图片上
+
+    emotion 为使用的差分，默认为当前差分
     """
     if text == "" and image is None:
         return None
+    if emotion is None:
+        emotion = get_current_emotion()
+
+    if image is None:
+        logging.info("从文本生成图片: " + text)
+    elif text == "":
+        logging.info("从剪切板中捕获了图片内容")
+    else:
+        logging.info("同时处理文本和图片内容")
+        logging.info("文本内容: " + text)
+
+    try:
+        result = renderer.render(make_request(text, image, emotion))
+    except Exception as e:
+        logging.error("生成图片失败: %s", e)
+        return None
+    logging.debug("排布方式: %s", result.layout)
+    return result.png
+
 
-    # 获取配置的区域坐标
+def render_animation(text: str, emotion: str) -> Optional[bytes]:
+    """
+    生成文字逐步出现的动图（GIF / APNG）
+    """
+    logging.info("生成动图: " + text)
     x1, y1 = config.text_box_topleft
     x2, y2 = config.image_box_bottomright
-    region_width = x2 - x1
-    region_height = y2 - y1
+    try:
+        return draw_text_animated(
+            image_source=renderer.base_image_for(emotion),
+            image_overlay=(
+                config.base_overlay_file if config.use_base_overlay else None
+            ),
+            top_left=(x1, y1),
+            bottom_right=(x2, y2),
+            text=text,
+            color=(0, 0, 0),
+            max_font_height=64,
+            font_path=font_source,
+            fmt=config.animated_output,
+            frame_count=config.animation_frames,
+            frame_duration=config.animation_frame_duration,
+            effects=render_style.effects,
+        )
+    except Exception as e:
+        logging.error("生成动图失败: %s", e)
+        return None
 
-    # 只有图像的情况
-    if text == "" and image is not None:
-        logging.info("从剪切板中捕获了图片内容")
-        try:
-            return paste_image_auto(
-                image_source=last_used_image_file,
-                image_overlay=(
-                    config.base_overlay_file if config.use_base_overlay else None
-                ),
-                top_left=(x1, y1),
-                bottom_right=(x2, y2),
-                content_image=image,
-                align="center",
-                valign="middle",
-                padding=12,
-                allow_upscale=True,
-                keep_alpha=True,
-            )
-        except Exception as e:
-            logging.error("生成图片失败: %s", e)
-            return None
 
-    # 只有文本的情况
-    elif text != "" and image is None:
-        logging.info("从文本生成图片: " + text)
-        try:
-            return draw_text_auto(
-                image_source=last_used_image_file,
+def render_text_pages(text: str, emotion: str) -> Optional[List[bytes]]:
+    """
+    长文本分页绘制，返回每页的 PNG 字节
+    """
+    x1, y1 = config.text_box_topleft
+    x2, y2 = config.image_box_bottomright
+    try:
+        return draw_text_paginated(
+            image_source=renderer.base_image_for(emotion),
+            image_overlay=(
+                config.base_overlay_file if config.use_base_overlay else None
+            ),
+            top_left=(x1, y1),
+            bottom_right=(x2, y2),
+            text=text,
+            color=(0, 0, 0),
+            max_font_height=64,
+            font_path=font_source,
+            effects=render_style.effects,
+            min_font_size=config.min_font_size,
+        )
+    except Exception as e:
+        logging.error("分页生成图片失败: %s", e)
+        return None
+
+
+def send_png_sequence(pages: List[bytes]):
+    """
+    逐页复制到剪贴板并黏贴发送
+    """
+    for page in pages:
+        copy_png_bytes_to_clipboard(page)
+        keyboard.send(config.paste_hotkey)
+        time.sleep(config.delay)
+        keyboard.send(config.send_hotkey)
+        time.sleep(config.delay)
+
+
+def is_foreground_allowed() -> bool:
+    """
+    检查当前前台进程是否在允许列表中（未设置允许列表时总是允许）
+    """
+    if not config.allowed_processes:
+        return True
+    try:
+        allowed, current_process = process_guard.check()
+    except Exception as e:
+        logging.error(f"无法获取当前进程名称: {e}")
+        allowed, current_process = False, None
+    if not allowed:
+        logging.info(f"当前进程 {current_process} 不在允许列表中，跳过执行")
+    return allowed
+
+
+def render_preview(text: str, image: Optional[Image.Image]) -> Optional[bytes]:
+    """
+    将内容渲染到所有差分底图上，拼接为一张预览图
+    """
+    x1, y1 = config.text_box_topleft
+    x2, y2 = config.image_box_bottomright
+    try:
+        if image is None:
+            return render_text_preview_sheet(
+                base_images=config.baseimage_mapping,
                 image_overlay=(
                     config.base_overlay_file if config.use_base_overlay else None
                 ),
@@ -195,127 +456,147 @@ def process_text_and_image(text: str, image: Optional[Image.Image]) -> Optional[
                 text=text,
                 color=(0, 0, 0),
                 max_font_height=64,
-                font_path=config.font_file,
+                font_path=font_source,
+                effects=render_style.effects,
             )
-        except Exception as e:
-            logging.error("生成图片失败: %s", e)
-            return None
 
-    # 同时有图像和文本的情况
+        # 多个线程共用同一张图片和同一份排版，先完成解码并计算排版
+        renderer.prepare(make_request(text, image, get_current_emotion()))
+
+        def render(emotion: str) -> Image.Image:
+            return renderer.render_image(make_request(text, image, emotion))[0]
+
+        tiles = render_emotion_previews(list(config.baseimage_mapping), render)
+        return encode_sheet(build_contact_sheet(tiles, font_source))
+    except Exception as e:
+        logging.error("生成预览图失败: %s", e)
+        return None
+
+
+def preview_all_emotions():
+    """
+    预览当前内容在所有表情差分上的效果，预览图用系统默认程序打开，输入内容放回输入框
+    """
+    init_runtime()
+    if not is_foreground_allowed():
+        return
+
+    user_pasted_image = try_get_image()
+    # 与发送时一样裁边并缩小图片，只处理一次，各差分共用；在剪切等待期间完成
+    prep_future = prep_pool.submit(prepare_pasted_image, user_pasted_image)
+    user_input, old_clipboard_content = cut_all_and_get_text()
+    try:
+        preview_image = prep_future.result()
+    except Exception as e:
+        logging.error("预处理失败: %s", e)
+        preview_image = user_pasted_image
+    if user_input == "" and user_pasted_image is None:
+        logging.info("未检测到文本或图片输入，取消预览")
+        return
+
+    # 预览时忽略差分指令
+    text = user_input
+    for keyword in config.baseimage_mapping:
+        text = text.replace(keyword, "")
+    text = text.strip()
+
+    t0 = time.perf_counter()
+    sheet_bytes = render_preview(text, preview_image)
+    logging.info(
+        "预览 %d 个差分耗时 %.1f ms",
+        len(config.baseimage_mapping),
+        (time.perf_counter() - t0) * 1000,
+    )
+
+    # 把剪切的文本放回输入框，图片放回剪贴板
+    if user_input:
+        pyperclip.copy(user_input)
+        keyboard.send(config.paste_hotkey)
+        time.sleep(config.delay)
+    if user_pasted_image is not None:
+        with io.BytesIO() as output:
+            user_pasted_image.save(output, "PNG")
+            copy_png_bytes_to_clipboard(output.getvalue())
     else:
-        logging.info("同时处理文本和图片内容")
-        logging.info("文本内容: " + text)
-        get_ratio(x1, y1, x2, y2)
-        try:
-            # 根据图像方向决定排布方式
-            if is_vertical_image(image):
-                logging.info("使用左右排布（竖图）")
-                # 左右排布：图像在左，文本在右
-                # 计算左右区域宽度（各占一半，留出间距）
-                spacing = 10  # 左右区域之间的间距
-                left_width = region_width // 2 - spacing // 2
-                right_width = region_width - left_width - spacing
-                
-                # 左区域（图像）
-                left_region_right = x1 + left_width
-                # 右区域（文本）
-                right_region_left = left_region_right + spacing
-                
-                # 先绘制左半部分的图像
-                intermediate_bytes = paste_image_auto(
-                    image_source=last_used_image_file,
-                    image_overlay=None,  # 暂时不应用overlay
-                    top_left=(x1, y1),
-                    bottom_right=(left_region_right, y2),
-                    content_image=image,
-                    align="center",
-                    valign="middle",
-                    padding=12,
-                    allow_upscale=True, 
-                    keep_alpha=True,
-                )
-                
-                # 在已有图像基础上添加右半部分的文本
-                final_bytes = draw_text_auto(
-                    image_source=io.BytesIO(intermediate_bytes),
-                    image_overlay=config.base_overlay_file if config.use_base_overlay else None,
-                    top_left=(right_region_left, y1),
-                    bottom_right=(x2, y2),
-                    text=text,
-                    color=(0, 0, 0),
-                    max_font_height=64,
-                    font_path=config.font_file,
-                )
-            else:
-                logging.info("使用上下排布（横图）")
-                # 上下排布：图像在上，文本在下
-                # 动态计算图像和文本的区域分配
-                # 根据文本长度和图像尺寸计算合适的比例
-                
-                # 估算文本所需高度（使用最大字体高度的一半作为初始估算）
-                estimated_text_height = min(region_height // 2, 100)
-                
-                # 图像区域（上半部分）
-                image_region_bottom = y1 + (region_height - estimated_text_height)
-                
-                # 文本区域（下半部分）
-                text_region_top = image_region_bottom
-                text_region_bottom = y2
-                
-                # 先绘制图像
-                intermediate_bytes = paste_image_auto(
-                    image_source=last_used_image_file,
-                    image_overlay=None,  # 暂时不应用overlay
-                    top_left=(x1, y1),
-                    bottom_right=(x2, image_region_bottom),
-                    content_image=image,
-                    align="center",
-                    valign="middle",
-                    padding=12,
-                    allow_upscale=True, 
-                    keep_alpha=True,
-                )
-                
-                # 在已有图像基础上添加文本
-                final_bytes = draw_text_auto(
-                    image_source=io.BytesIO(intermediate_bytes),
-                    image_overlay=config.base_overlay_file if config.use_base_overlay else None,
-                    top_left=(x1, text_region_top),
-                    bottom_right=(x2, text_region_bottom),
-                    text=text,
-                    color=(0, 0, 0),
-                    max_font_height=64,
-                    font_path=config.font_file,
-                )
-            
-            return final_bytes
-            
-        except Exception as e:
-            logging.error("生成图片失败: %s", e)
-            return None
+        pyperclip.copy(old_clipboard_content)
+
+    if sheet_bytes is None:
+        return
+    preview_path = os.path.join(tempfile.gettempdir(), "anan_sketchbook_preview.png")
+    with open(preview_path, "wb") as f:
+        f.write(sheet_bytes)
+    os.startfile(preview_path)
+
+
+def prepare_render_inputs(
+    image: Optional[Image.Image], image_file: str
+) -> Tuple[Optional[Image.Image], float]:
+    """
+    与文本无关的渲染准备：解码、裁边并缩小剪贴板图片、加载当前差分底图与置顶图层、预热字体。
+
+    返回 (处理后的图片, 耗时毫秒)。
+    """
+    t0 = time.perf_counter()
+    _, y1 = config.text_box_topleft
+    _, y2 = config.image_box_bottomright
+
+    load_rgba(image_file)
+    if config.use_base_overlay:
+        load_overlay(config.base_overlay_file)
+    # 字号二分搜索的第一个候选
+    load_font(font_source, (1 + min(y2 - y1, 64)) // 2)
+    image = prepare_pasted_image(image)
+
+    return image, (time.perf_counter() - t0) * 1000
+
+
+def prepare_pasted_image(image: Optional[Image.Image]) -> Optional[Image.Image]:
+    """
+    按配置裁边并缩小剪贴板图片，发送与预览共用
+    """
+    if image is None:
+        return None
+    x1, y1 = config.text_box_topleft
+    x2, y2 = config.image_box_bottomright
+    # 先裁边再缩小，缩放只作用在内容上
+    if config.trim_pasted_image:
+        image = trim_borders(image, config.trim_tolerance)
+    return prescale_image(image, x2 - x1, y2 - y1)
 
 
 def generate_image():
     """
     生成图像的主函数
     """
-    global last_used_image_file  # 保存上次使用差分
+    # 后台加载尚未完成时在此等待
+    init_runtime()
 
     # 检查是否设置了允许的进程列表，如果设置了，则检查当前进程是否在允许列表中
-    if config.allowed_processes:
-        current_process = get_foreground_window_process_name()
-        if current_process is None or current_process not in [
-            p.lower() for p in config.allowed_processes
-        ]:
-            logging.info(f"当前进程 {current_process} 不在允许列表中，跳过执行")
-            # 如果不是在允许的进程中，直接发送原始热键
-            if not config.block_hotkey:
-                keyboard.send(config.hotkey)
-            return
+    if not is_foreground_allowed():
+        # 如果不是在允许的进程中，直接发送原始热键
+        if not config.block_hotkey:
+            keyboard.send(config.hotkey)
+        return
+
+    timer = StageTimer()
+    emotion = get_current_emotion()
 
     # `cut_all_and_get_text` 会清空剪切板，所以 `try_get_image` 要在前面调用
     user_pasted_image = try_get_image()
+    timer.mark("读取剪贴板图片")
+
+    # 剪切文本需要等待 config.delay，期间在后台完成与文本无关的准备工作
+    prep_future = prep_pool.submit(
+        prepare_render_inputs, user_pasted_image, renderer.base_image_for(emotion)
+    )
     user_input, old_clipboard_content = cut_all_and_get_text()
+    timer.mark("剪切文本")
+    try:
+        user_pasted_image, prep_ms = prep_future.result()
+    except Exception as e:
+        logging.error("预处理失败: %s", e)
+        prep_ms = 0.0
+    timer.mark("等待预处理")
     logging.debug(f"用户粘贴图片: {user_pasted_image is not None}")
     logging.debug(f"用户输入的文本内容: {user_input}")
     logging.debug(f"历史剪贴板内容: {old_clipboard_content}")
@@ -330,18 +611,97 @@ def generate_image():
     for keyword, img_file in config.baseimage_mapping.items():
         if keyword not in user_input:
             continue
-        last_used_image_file = img_file
+        # 保存上次使用差分
+        emotion = keyword
+        set_current_emotion(keyword)
         user_input = user_input.replace(keyword, "").strip()
-        logging.info(f"检测到关键词 '{keyword}'，使用底图: {last_used_image_file}")
+        logging.info(f"检测到关键词 '{keyword}'，使用底图: {img_file}")
         break
 
-    png_bytes = process_text_and_image(user_input, user_pasted_image)
+    output_kind = choose_output_kind(user_pasted_image is None)
+    output = render_output(user_input, user_pasted_image, emotion, output_kind)
+    timer.mark("渲染")
 
-    if png_bytes is None:
-        logging.error("生成图片失败！未生成 PNG 字节。")
+    if output is None:
+        logging.error("生成图片失败！未生成图片字节。")
         return
 
-    copy_png_bytes_to_clipboard(png_bytes)
+    send_output(output, output_kind)
+
+    # 恢复原始剪贴板内容
+    pyperclip.copy(old_clipboard_content)
+
+    timer.mark("发送")
+    logging.info("成功地生成并发送图片！")
+    logging.info(
+        "阶段耗时: %s; 后台预处理 %.1f ms 与剪切等待重叠", timer.summary(), prep_ms
+    )
+
+    # 只记录渲染输入，重发时重新渲染或命中渲染缓存
+    send_history.record(user_input, emotion, user_pasted_image, output_kind)
+
+
+def choose_output_kind(text_only: bool) -> str:
+    """
+    根据配置决定输出类型：纯文本且开启动图输出时为 "gif" / "apng"，
+    按配置分页时为 "pages"，否则为 "png"
+    """
+    if text_only and config.animated_output in ("gif", "apng"):
+        return config.animated_output
+    if text_only and config.pagination_mode in ("sequence", "stack"):
+        return "pages"
+    return "png"
+
+
+def render_output(
+    text: str, image: Optional[Image.Image], emotion: str, output_kind: str
+) -> Union[bytes, List[bytes], None]:
+    """
+    按输出类型渲染，纯文本内容优先从渲染缓存中取
+    """
+    render_key = (text, emotion, output_kind) if image is None else None
+    output = render_cache.get(render_key) if render_key is not None else None
+    if output is None:
+        if output_kind in ("gif", "apng"):
+            output = render_animation(text, emotion)
+        elif output_kind == "pages":
+            output = render_text_pages(text, emotion)
+        else:
+            output = process_text_and_image(text, image, emotion)
+        # 常驻模式下不缓存整张输出，降低常驻内存
+        if output is not None and render_key is not None and not config.resident_mode:
+            render_cache.put(render_key, output)
+    return output
+
+
+def send_output(output: Union[bytes, List[bytes]], output_kind: str):
+    """
+    将渲染结果复制到剪贴板，并按配置自动黏贴、发送
+    """
+    output_bytes = output
+    if output_kind == "pages":
+        logging.info("文本共分为 %d 页", len(output))
+        if len(output) == 1:
+            output_bytes = output[0]
+        elif (
+            config.pagination_mode == "sequence"
+            and config.auto_paste_image
+            and config.auto_send_image
+        ):
+            # 前几页逐张发送，最后一页走下面的常规流程
+            send_png_sequence(output[:-1])
+            output_bytes = output[-1]
+        else:
+            output_bytes = stack_pages(output)
+
+    if output_kind in ("gif", "apng"):
+        suffix = ".gif" if output_kind == "gif" else ".png"
+        output_path = os.path.join(tempfile.gettempdir(), "anan_sketchbook" + suffix)
+        with open(output_path, "wb") as f:
+            f.write(output_bytes)
+        copy_file_to_clipboard(output_path)
+    else:
+        copy_png_bytes_to_clipboard(output_bytes)
 
     if config.auto_paste_image:
         keyboard.send(config.paste_hotkey)
@@ -351,18 +711,44 @@ def generate_image():
         if config.auto_send_image:
             keyboard.send(config.send_hotkey)
 
+
+def resend_from_history(index: int = 0):
+    """
+    重新发送第 index 条（0 为最近一次）历史记录，无需剪切输入框
+    """
+    init_runtime()
+    if not is_foreground_allowed():
+        return
+
+    item = send_history.get(index)
+    if item is None:
+        logging.info("没有可重发的历史记录")
+        return
+    entry, image = item
+
+    timer = StageTimer()
+    output = render_output(entry.text, image, entry.emotion, entry.kind)
+    timer.mark("渲染")
+    if output is None:
+        logging.error("重发失败！未生成图片字节。")
+        return
+
+    old_clipboard_content = pyperclip.paste()
+    send_output(output, entry.kind)
     # 恢复原始剪贴板内容
     pyperclip.copy(old_clipboard_content)
+    timer.mark("发送")
 
-    logging.info("成功地生成并发送图片！")
+    send_history.record(entry.text, entry.emotion, image, entry.kind)
+    logging.info("已重发历史记录 #%d; 阶段耗时: %s", index, timer.summary())
 
-def get_ratio(x1, y1, x2, y2):
-    try:
-        global ratio
-        ratio = (x2 - x1) / (y2 - y1)
-        logging.info("比例: %s", ratio)
-    except Exception as e:
-        logging.error("计算比例时出错: %s", e)
+
+def log_memory_report():
+    """
+    输出按子系统划分的内存报告
+    """
+    init_runtime()
+    logging.info("内存报告:\n%s", memory_report())
 
 # 绑定 Ctrl+Alt+H 作为全局热键
 is_hotkey_bound = keyboard.add_hotkey(
@@ -371,13 +757,37 @@ is_hotkey_bound = keyboard.add_hotkey(
     suppress=config.block_hotkey or config.hotkey == config.send_hotkey,
 )
 
+# 注册表情切换快捷键
+register_emotion_switch_hotkeys()
+
+# 内存报告：按需热键
+if config.memory_report_hotkey:
+    keyboard.add_hotkey(config.memory_report_hotkey, log_memory_report, suppress=False)
+
+# 全部差分预览热键
+if config.preview_hotkey:
+    keyboard.add_hotkey(config.preview_hotkey, preview_all_emotions, suppress=False)
+
+# 重发最近一次发送的内容
+if config.resend_hotkey:
+    keyboard.add_hotkey(config.resend_hotkey, resend_from_history, suppress=False)
+
+logging.info(
+    "热键就绪，耗时 %.1f ms", (time.perf_counter() - _start_time) * 1000
+)
 logging.info("热键绑定: " + str(bool(is_hotkey_bound)))
 logging.info("允许的进程: " + str(config.allowed_processes))
 logging.info("键盘监听已启动，按下 {} 以生成图片".format(config.hotkey))
-
-# 注册表情切换快捷键
-register_emotion_switch_hotkeys()
 logging.info("表情切换快捷键已注册: " + str(config.emotion_switch_hotkeys))
+if config.memory_report_hotkey:
+    logging.info("内存报告快捷键: " + config.memory_report_hotkey)
+if config.preview_hotkey:
+    logging.info("差分预览快捷键: " + config.preview_hotkey)
+if config.resend_hotkey:
+    logging.info("重发快捷键: " + config.resend_hotkey)
+
+# 在后台线程中预加载渲染模块，首次按下热键时无需等待导入
+threading.Thread(target=init_runtime, name="runtime-warmup", daemon=True).start()
 
 # 保持程序运行
 try:
@@ -0,0 +1,344 @@
+# filename: memory_budget.py
+import itertools
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+# 无法精确测量时（如字体对象）使用的估算大小
+DEFAULT_OBJECT_SIZE = 128 * 1024
+
+# tracemalloc 统计时，按来源文件归类到的子系统
+# 未列出的本项目模块按模块名归类
+_SUBSYSTEM_FILES: Dict[str, str] = {
+    "text_fit_draw.py": "text",
+    "text_effects.py": "text",
+    "font_fallback.py": "text",
+    "text_animation.py": "animation",
+    "text_pagination.py": "pagination",
+    "image_fit_paste.py": "image",
+    "asset_cache.py": "assets",
+    "renderer.py": "renderer",
+    "preview_sheet.py": "preview",
+    "main.py": "main",
+    "memory_budget.py": "cache",
+    "process_resolver.py": "process",
+    "config_loader.py": "config",
+    "config_model.py": "config",
+    "send_history.py": "history",
+}
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    估算对象占用的字节数，用于缓存记账。
+    """
+    if isinstance(obj, Image.Image):
+        return obj.width * obj.height * len(obj.getbands())
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, str):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(estimate_size(o) for o in obj)
+    if isinstance(obj, (int, float, bool)) or obj is None:
+        return sys.getsizeof(obj)
+    return DEFAULT_OBJECT_SIZE
+
+
+class MemoryBudget:
+    """
+    所有缓存共享的全局内存预算。
+
+    超出预算时，在所有已注册缓存中按最近最少使用的顺序淘汰条目。
+    """
+
+    def __init__(self, limit_bytes: int) -> None:
+        self.limit_bytes = limit_bytes
+        self._caches: Dict[str, "BudgetedCache"] = {}
+        # 不可淘汰的占用（如发送历史），只出现在内存报告中，不计入预算
+        self._trackers: Dict[str, Callable[[], Tuple[int, int]]] = {}
+        self._lock = threading.RLock()
+        self._tick = itertools.count()
+
+    def register(self, cache: "BudgetedCache") -> None:
+        """
+        登记缓存。同一预算中的缓存名必须唯一，重名时抛出 ValueError，以免前一个缓存
+        从淘汰与报告中消失。
+        """
+        with self._lock:
+            existing = self._caches.get(cache.name)
+            if existing is not None and existing is not cache:
+                raise ValueError(f"缓存名 {cache.name!r} 已被占用")
+            self._caches[cache.name] = cache
+
+    def register_tracker(self, name: str, usage: Callable[[], Tuple[int, int]]) -> None:
+        """
+        登记一个不可淘汰的内存占用，usage() 返回 (条目数, 字节数)。
+
+        其占用只出现在内存报告中，不计入 used_bytes，也不会让各缓存为它让出空间；
+        调用方需自行限制大小。名称重复时抛出 ValueError。
+        """
+        with self._lock:
+            if name in self._trackers:
+                raise ValueError(f"占用名 {name!r} 已被占用")
+            self._trackers[name] = usage
+
+    def next_tick(self) -> int:
+        return next(self._tick)
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(c.nbytes for c in self._caches.values())
+
+    def usage(self) -> Dict[str, Tuple[int, int]]:
+        """
+        返回各缓存的 {子系统名: (条目数, 字节数)}。
+        """
+        with self._lock:
+            return {name: (len(c), c.nbytes) for name, c in self._caches.items()}
+
+    def tracked_usage(self) -> Dict[str, Tuple[int, int]]:
+        """
+        返回不可淘汰占用的 {名称: (条目数, 字节数)}。
+        """
+        with self._lock:
+            trackers = dict(self._trackers)
+        return {name: usage() for name, usage in trackers.items()}
+
+    def enforce(self) -> None:
+        """
+        淘汰最久未使用的条目，直到总占用不超过预算。
+        """
+        with self._lock:
+            used = self.used_bytes
+            while used > self.limit_bytes:
+                victim = None
+                oldest = None
+                for cache in self._caches.values():
+                    tick = cache.oldest_tick()
+                    if tick is not None and (oldest is None or tick < oldest):
+                        victim, oldest = cache, tick
+                if victim is None:
+                    break
+                used -= victim.evict_oldest()
+
+    def set_limit(self, limit_bytes: int) -> None:
+        with self._lock:
+            self.limit_bytes = limit_bytes
+            self.enforce()
+
+    def clear(self) -> None:
+        with self._lock:
+            for cache in self._caches.values():
+                cache.clear()
+
+
+class BudgetedCache:
+    """
+    计入全局内存预算的 LRU 缓存。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        budget: Optional[MemoryBudget] = None,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ) -> None:
+        self.name = name
+        self.budget = budget or get_budget()
+        self._sizeof = sizeof
+        # key -> (value, 字节数, 最近使用时刻)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, int]]" = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.budget.register(self)
+
+    @property
+    def _lock(self) -> threading.RLock:
+        return self.budget._lock
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries[key] = (entry[0], entry[1], self.budget.next_tick())
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        nbytes = self._sizeof(value) if size is None else size
+        # 单个条目超过总预算时不缓存
+        if nbytes > self.budget.limit_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[key] = (value, nbytes, self.budget.next_tick())
+            self._nbytes += nbytes
+            self.budget.enforce()
+
+    def get_or_create(
+        self, key: Hashable, factory: Callable[[], Any], size: Optional[int] = None
+    ) -> Any:
+        """
+        命中则返回缓存值，否则调用 factory 创建并缓存。
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value, size)
+        return value
+
+    def oldest_tick(self) -> Optional[int]:
+        with self._lock:
+            if not self._entries:
+                return None
+            return next(iter(self._entries.values()))[2]
+
+    def evict_oldest(self) -> int:
+        with self._lock:
+            if not self._entries:
+                return 0
+            _, (_, nbytes, _) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+            return nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+
+_MISSING = object()
+_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> MemoryBudget:
+    """
+    获取进程内唯一的全局内存预算（默认 64 MB）。
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget(64 * 1024 * 1024)
+        return _budget
+
+
+def configure_budget(limit_mb: float) -> MemoryBudget:
+    """
+    设置全局内存预算上限（MB）。
+    """
+    budget = get_budget()
+    budget.set_limit(int(limit_mb * 1024 * 1024))
+    return budget
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        import psutil
+
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return None
+
+
+def _subsystem_of(filename: str) -> str:
+    base = os.path.basename(filename)
+    if base in _SUBSYSTEM_FILES:
+        return _SUBSYSTEM_FILES[base]
+    # 只把本项目目录下真实存在的 .py 文件按模块名归类（排除 <frozen ...>、<string> 等）
+    if (
+        not filename.startswith("<")
+        and filename.endswith(".py")
+        and os.path.isfile(filename)
+        and os.path.dirname(os.path.abspath(filename)) == _PROJECT_DIR
+    ):
+        return os.path.splitext(base)[0]
+    normalized = filename.replace("\\", "/")
+    if "/PIL/" in normalized:
+        return "pillow"
+    return "other"
+
+
+def memory_report(budget: Optional[MemoryBudget] = None) -> str:
+    """
+    生成按子系统划分的内存报告：进程 RSS、各缓存占用，
+    以及 tracemalloc 开启时按来源模块统计的分配量。
+    """
+    budget = budget or get_budget()
+    mb = 1024 * 1024
+    lines: List[str] = []
+
+    rss = _rss_bytes()
+    if rss is not None:
+        lines.append(f"RSS: {rss / mb:.1f} MB")
+
+    lines.append(
+        f"缓存: {budget.used_bytes / mb:.1f} MB / 预算 {budget.limit_bytes / mb:.1f} MB"
+    )
+    for name, (count, nbytes) in sorted(budget.usage().items()):
+        lines.append(f"  [{name}] {count} 项, {nbytes / 1024:.1f} KB")
+    for name, (count, nbytes) in sorted(budget.tracked_usage().items()):
+        lines.append(f"  [{name}] {count} 项, {nbytes / 1024:.1f} KB（不计入预算）")
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"tracemalloc: 当前 {current / mb:.1f} MB, 峰值 {peak / mb:.1f} MB")
+        per_subsystem: Dict[str, int] = {}
+        for stat in tracemalloc.take_snapshot().statistics("filename"):
+            key = _subsystem_of(stat.traceback[0].filename)
+            per_subsystem[key] = per_subsystem.get(key, 0) + stat.size
+        for key, size in sorted(per_subsystem.items(), key=lambda kv: -kv[1]):
+            lines.append(f"  <{key}> {size / 1024:.1f} KB")
+
+    return "\n".join(lines)
+
+
+class MemoryReporter:
+    """
+    后台定期输出内存报告的守护线程。
+    """
+
+    def __init__(self, interval: float, budget: Optional[MemoryBudget] = None) -> None:
+        self.interval = interval
+        self.budget = budget
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="memory-reporter", daemon=True
+        )
+
+    def start(self) -> "MemoryReporter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            logging.info("内存报告:\n%s", memory_report(self.budget))
@@ -0,0 +1,141 @@
+# filename: preview_sheet.py
+import math
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image, ImageDraw
+
+from text_effects import TextEffects
+from text_fit_draw import (
+    Align,
+    FontSource,
+    RGBColor,
+    VAlign,
+    draw_string,
+    fit_text,
+    load_font,
+    render_text_image,
+    text_length,
+)
+
+# 缩略图缩小倍数（整数倍 reduce，速度快）
+THUMB_REDUCE = 2
+
+
+def render_emotion_previews(
+    emotions: Sequence[str],
+    render: Callable[[str], Image.Image],
+    max_workers: Optional[int] = None,
+    reduce: int = THUMB_REDUCE,
+) -> List[Tuple[str, Image.Image]]:
+    """
+    在线程池中为每个表情调用 render(表情名)，返回 [(表情名, 缩略图), ...]。
+    """
+
+    def work(emotion: str) -> Tuple[str, Image.Image]:
+        img = render(emotion)
+        if reduce > 1:
+            img = img.reduce(reduce)
+        return emotion, img
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preview") as pool:
+        return list(pool.map(work, emotions))
+
+
+def build_contact_sheet(
+    tiles: List[Tuple[str, Image.Image]],
+    font_path: FontSource = None,
+    columns: Optional[int] = None,
+    spacing: int = 8,
+    label_size: int = 20,
+    background: Tuple[int, int, int, int] = (255, 255, 255, 255),
+) -> Image.Image:
+    """
+    将带标签的缩略图按网格拼接为一张预览图，标签绘制在每张缩略图下方。
+    """
+    if not tiles:
+        raise ValueError("没有可拼接的预览图。")
+    columns = columns or math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    tile_w = max(img.width for _, img in tiles)
+    tile_h = max(img.height for _, img in tiles)
+
+    font = load_font(font_path, label_size)
+    ascent, descent = font.getmetrics()
+    label_h = ascent + descent + spacing
+
+    cell_w, cell_h = tile_w + spacing, tile_h + label_h + spacing
+    sheet = Image.new("RGBA", (columns * cell_w + spacing, rows * cell_h + spacing), background)
+    draw = ImageDraw.Draw(sheet)
+    for index, (label, img) in enumerate(tiles):
+        col, row = index % columns, index // columns
+        x = spacing + col * cell_w
+        y = spacing + row * cell_h
+        sheet.paste(img, (x + (tile_w - img.width) // 2, y))
+        lx = x + (tile_w - int(text_length(draw, label, font))) // 2
+        draw_string(draw, (lx, y + tile_h + spacing // 2), label, font, (0, 0, 0))
+    return sheet
+
+
+def render_text_preview_sheet(
+    base_images: Dict[str, str],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: RGBColor = (0, 0, 0),
+    max_font_height: Optional[int] = None,
+    font_path: FontSource = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: RGBColor = (128, 0, 128),
+    image_overlay: Union[str, Image.Image, None] = None,
+    effects: Optional[TextEffects] = None,
+    columns: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> bytes:
+    """
+    把文本绘制到所有差分底图上并拼接为预览图（PNG 字节）。
+
+    所有差分共用同一文字区域，因此字号搜索与换行只计算一次，各底图并发渲染。
+    """
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    if not (x2 > x1 and y2 > y1):
+        raise ValueError("无效的文字区域。")
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    layout = fit_text(
+        measure, text, x2 - x1, y2 - y1, font_path, max_font_height, line_spacing
+    )
+
+    def render(emotion: str) -> Image.Image:
+        return render_text_image(
+            image_source=base_images[emotion],
+            top_left=top_left,
+            bottom_right=bottom_right,
+            text=text,
+            color=color,
+            max_font_height=max_font_height,
+            font_path=font_path,
+            align=align,
+            valign=valign,
+            line_spacing=line_spacing,
+            bracket_color=bracket_color,
+            image_overlay=image_overlay,
+            layout=layout,
+            effects=effects,
+        )
+
+    tiles = render_emotion_previews(list(base_images), render, max_workers)
+    return encode_sheet(build_contact_sheet(tiles, font_path, columns))
+
+
+def encode_sheet(sheet: Image.Image) -> bytes:
+    """
+    将预览图编码为 PNG 字节。
+    """
+    buf = BytesIO()
+    sheet.save(buf, format="PNG")
+    return buf.getvalue()
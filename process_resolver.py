@@ -0,0 +1,177 @@
+# filename: process_resolver.py
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import psutil
+
+try:
+    from typing import Protocol
+except ImportError:  # pragma: no cover  # Python 3.7 及以下
+    Protocol = object  # type: ignore
+
+# (窗口句柄, 进程 pid)
+WindowKey = Tuple[int, int]
+
+
+class WindowLookup(Protocol):
+    """
+    前台窗口查询接口，便于在非 Windows 平台上替换实现。
+    """
+
+    def foreground_window(self) -> Optional[WindowKey]:
+        """
+        返回 (hwnd, pid)，无法获取时返回 None。
+        """
+        ...
+
+
+class Win32WindowLookup:
+    """
+    基于 win32gui / win32process 的前台窗口查询实现。
+    """
+
+    def __init__(self) -> None:
+        # 延迟导入，保证本模块在非 Windows 平台上也能被导入
+        import win32gui
+        import win32process
+
+        self._win32gui = win32gui
+        self._win32process = win32process
+
+    def foreground_window(self) -> Optional[WindowKey]:
+        hwnd = self._win32gui.GetForegroundWindow()
+        if not hwnd:
+            return None
+        _, pid = self._win32process.GetWindowThreadProcessId(hwnd)
+        return hwnd, pid
+
+
+class ProcessNameResolver:
+    """
+    带缓存的 pid → 进程名解析器。
+
+    缓存条目在 ttl 秒内直接返回，不调用 psutil；过期或调用方要求校验时只比对进程创建时间，
+    创建时间不变说明 pid 未被复用，沿用旧名称并续期，否则重新读取进程名。
+    """
+
+    def __init__(
+        self,
+        ttl: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+        max_entries: int = 64,
+    ) -> None:
+        self.ttl = ttl
+        self._clock = clock
+        self._max_entries = max_entries
+        # pid -> (进程名, 创建时间, 过期时刻)
+        self._cache: Dict[int, Tuple[str, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def name_of(self, pid: int, validate: bool = False) -> Optional[str]:
+        """
+        返回 pid 对应的小写进程名，进程不存在或无权访问时返回 None。
+
+        validate 为 True 时即使缓存未过期也校验进程创建时间（如前台窗口发生变化时）。
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._cache.get(pid)
+        if entry is not None and now < entry[2] and not validate:
+            return entry[0]
+
+        try:
+            # Process 构造时已读取创建时间，create_time() 不再产生额外的系统调用
+            process = psutil.Process(pid)
+            create_time = process.create_time()
+            if entry is not None and entry[1] == create_time:
+                name = entry[0]
+            else:
+                name = process.name().lower()
+        except (psutil.Error, OSError):
+            with self._lock:
+                self._cache.pop(pid, None)
+            return None
+
+        with self._lock:
+            if pid not in self._cache and len(self._cache) >= self._max_entries:
+                self._cache.clear()
+            self._cache[pid] = (name, create_time, now + self.ttl)
+        return name
+
+    def invalidate(self, pid: Optional[int] = None) -> None:
+        """
+        清除指定 pid（或全部）的缓存。
+        """
+        with self._lock:
+            if pid is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(pid, None)
+
+
+class ForegroundProcessGuard:
+    """
+    判断前台窗口所属进程是否在允许列表中，判断结果按 (hwnd, pid) 缓存。
+
+    同一窗口在 ttl 秒内重复判断时直接返回缓存结果，不调用 psutil；缓存过期或前台窗口
+    变化时才经 ProcessNameResolver 校验进程创建时间，pid 被复用时不会沿用旧进程的结果。
+    """
+
+    def __init__(
+        self,
+        allowed_processes: Iterable[str],
+        lookup: Optional[WindowLookup] = None,
+        resolver: Optional[ProcessNameResolver] = None,
+        ttl: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.allowed = frozenset(p.lower() for p in allowed_processes)
+        self._lookup = lookup
+        self._resolver = resolver or ProcessNameResolver(ttl=ttl, clock=clock)
+        self._ttl = ttl
+        self._clock = clock
+        # (hwnd, pid) -> (是否允许, 进程名, 过期时刻)
+        self._decisions: Dict[WindowKey, Tuple[bool, Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def lookup(self) -> WindowLookup:
+        if self._lookup is None:
+            self._lookup = Win32WindowLookup()
+        return self._lookup
+
+    def foreground_process_name(self) -> Optional[str]:
+        """
+        获取当前前台窗口的进程名称。
+        """
+        key = self.lookup.foreground_window()
+        if key is None:
+            return None
+        return self._resolver.name_of(key[1])
+
+    def check(self) -> Tuple[bool, Optional[str]]:
+        """
+        返回 (是否允许, 前台进程名)。允许列表为空时总是允许。
+        """
+        if not self.allowed:
+            return True, None
+
+        key = self.lookup.foreground_window()
+        if key is None:
+            return False, None
+
+        now = self._clock()
+        with self._lock:
+            cached = self._decisions.get(key)
+        if cached is not None and now < cached[2]:
+            return cached[0], cached[1]
+
+        # 缓存过期或换了窗口：校验创建时间后再判断
+        name = self._resolver.name_of(key[1], validate=True)
+        allowed = name is not None and name in self.allowed
+        with self._lock:
+            if key not in self._decisions and len(self._decisions) >= 64:
+                self._decisions.clear()
+            self._decisions[key] = (allowed, name, now + self._ttl)
+        return allowed, name
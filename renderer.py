@@ -0,0 +1,224 @@
+# filename: renderer.py
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from asset_cache import open_canvas
+from image_fit_paste import render_pasted_image
+from memory_budget import BudgetedCache
+from text_effects import TextEffects
+from text_fit_draw import (
+    Align,
+    FontSource,
+    RGBColor,
+    TextLayout,
+    VAlign,
+    fit_text,
+    render_text_image,
+)
+
+# (x1, y1, x2, y2)
+Region = Tuple[int, int, int, int]
+
+# (文本, 区域宽高, 字体, 最大字号, 行距) -> TextLayout，所有 Renderer 共用，相同区域的不同差分可共用
+_layout_cache = BudgetedCache("layouts")
+
+
+class RenderStyle(NamedTuple):
+    """
+    与内容无关的绘制样式。
+    """
+
+    font_path: FontSource = None
+    color: RGBColor = (0, 0, 0)
+    bracket_color: RGBColor = (128, 0, 128)
+    max_font_height: Optional[int] = 64
+    line_spacing: float = 0.15
+    align: Align = "center"
+    valign: VAlign = "middle"
+    padding: int = 12
+    spacing: int = 10
+    overlay: Optional[str] = None
+    effects: TextEffects = TextEffects()
+
+
+class RenderRequest(NamedTuple):
+    """
+    一次渲染所需的全部输入。image 在渲染期间只读，调用方不应再修改它。
+    """
+
+    text: str
+    image: Optional[Image.Image]
+    emotion: str
+    region: Region
+    style: RenderStyle = RenderStyle()
+
+
+class RenderResult(NamedTuple):
+    png: bytes
+    layout: str
+    """排布方式：text / image / side_by_side / stacked"""
+
+
+def is_vertical_image(image: Image.Image, region: Region) -> bool:
+    """
+    判断图像相对于区域是否为竖图
+    """
+    x1, y1, x2, y2 = region
+    return image.height * (x2 - x1) > image.width * (y2 - y1)
+
+
+class Renderer:
+    """
+    可重入的渲染核心：不依赖任何全局状态，只共享线程安全的缓存，可在多个线程中并发调用。
+
+    相同的请求总是得到相同的结果。
+    """
+
+    def __init__(self, base_images: Mapping[str, str], default_base: str) -> None:
+        self.base_images: Dict[str, str] = dict(base_images)
+        self.default_base = default_base
+        self._layouts = _layout_cache
+
+    def base_image_for(self, emotion: str) -> str:
+        return self.base_images.get(emotion, self.default_base)
+
+    def _layout(self, text: str, region: Region, style: RenderStyle) -> TextLayout:
+        x1, y1, x2, y2 = region
+        font_key = style.font_path
+        if font_key is not None and not isinstance(font_key, str):
+            font_key = tuple(font_key)
+        key = (text, x2 - x1, y2 - y1, font_key, style.max_font_height, style.line_spacing)
+        layout = self._layouts.get(key)
+        if layout is None:
+            measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+            layout = fit_text(
+                measure,
+                text,
+                x2 - x1,
+                y2 - y1,
+                style.font_path,
+                style.max_font_height,
+                style.line_spacing,
+            )
+            self._layouts.put(key, layout, 256 + 4 * len(text))
+        return layout
+
+    def _draw_text(
+        self, canvas: Image.Image, text: str, region: Region, style: RenderStyle
+    ) -> Image.Image:
+        x1, y1, x2, y2 = region
+        return render_text_image(
+            image_source=canvas,
+            top_left=(x1, y1),
+            bottom_right=(x2, y2),
+            text=text,
+            color=style.color,
+            max_font_height=style.max_font_height,
+            font_path=style.font_path,
+            align=style.align,
+            valign=style.valign,
+            line_spacing=style.line_spacing,
+            bracket_color=style.bracket_color,
+            image_overlay=style.overlay,
+            layout=self._layout(text, region, style),
+            effects=style.effects,
+        )
+
+    def _paste(
+        self,
+        canvas: Image.Image,
+        image: Image.Image,
+        region: Region,
+        style: RenderStyle,
+        overlay: bool,
+    ) -> Image.Image:
+        x1, y1, x2, y2 = region
+        return render_pasted_image(
+            image_source=canvas,
+            top_left=(x1, y1),
+            bottom_right=(x2, y2),
+            content_image=image,
+            align="center",
+            valign="middle",
+            padding=style.padding,
+            allow_upscale=True,
+            keep_alpha=True,
+            image_overlay=style.overlay if overlay else None,
+        )
+
+    def render_image(self, request: RenderRequest) -> Tuple[Image.Image, str]:
+        """
+        渲染并返回 (未编码的图像, 排布方式)。
+        """
+        text, image, style = request.text, request.image, request.style
+        if text == "" and image is None:
+            raise ValueError("文本和图片不能同时为空。")
+
+        canvas = open_canvas(self.base_image_for(request.emotion))
+
+        # 只有图像
+        if text == "":
+            return self._paste(canvas, image, request.region, style, True), "image"
+
+        # 只有文本
+        if image is None:
+            return self._draw_text(canvas, text, request.region, style), "text"
+
+        # 同时有图像和文本，根据图像方向决定排布方式
+        kind, image_region, text_region = self._split(request)
+        canvas = self._paste(canvas, image, image_region, style, False)
+        return self._draw_text(canvas, text, text_region, style), kind
+
+    def _split(self, request: RenderRequest) -> Tuple[str, Region, Region]:
+        """
+        同时有图像和文本时返回 (排布方式, 图像区域, 文本区域)。
+        """
+        x1, y1, x2, y2 = request.region
+        spacing = request.style.spacing
+        if is_vertical_image(request.image, request.region):
+            # 左右排布：图像在左，文本在右，中间留出间距
+            left_right = x1 + (x2 - x1) // 2 - spacing // 2
+            return "side_by_side", (x1, y1, left_right, y2), (left_right + spacing, y1, x2, y2)
+
+        # 上下排布：图像在上，文本在下，文本区域高度取区域的一半与 100 中的较小值
+        text_height = min((y2 - y1) // 2, 100)
+        image_bottom = y1 + (y2 - y1 - text_height)
+        return "stacked", (x1, y1, x2, image_bottom), (x1, image_bottom, x2, y2)
+
+    def prepare(self, request: RenderRequest) -> None:
+        """
+        预先计算请求的文字排版并放入缓存。
+
+        分发到多个线程渲染同一内容（如各差分）之前调用，字号搜索只进行一次。
+        """
+        if request.text == "":
+            return
+        region = request.region
+        if request.image is not None:
+            request.image.load()
+            region = self._split(request)[2]
+        self._layout(request.text, region, request.style)
+
+    def render(self, request: RenderRequest) -> RenderResult:
+        """
+        渲染并编码为 PNG。
+        """
+        img, layout = self.render_image(request)
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+        return RenderResult(buf.getvalue(), layout)
+
+    def render_many(
+        self, requests: Sequence[RenderRequest], max_workers: Optional[int] = None
+    ) -> List[RenderResult]:
+        """
+        在线程池中并发渲染多个请求，结果顺序与请求一致。
+        """
+        for request in requests:
+            # 多个线程可能共用同一张图片，先在当前线程完成解码并计算排版
+            self.prepare(request)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render") as pool:
+            return list(pool.map(self.render, requests))
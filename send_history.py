@@ -0,0 +1,154 @@
+# filename: send_history.py
+import hashlib
+import threading
+from collections import deque
+from io import BytesIO
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from memory_budget import MemoryBudget, estimate_size, get_budget
+
+
+class HistoryEntry(NamedTuple):
+    """
+    一条发送记录：只保存重新渲染所需的输入，不保存输出的图片。
+    """
+
+    text: str
+    emotion: str
+    image_hash: Optional[str]
+    """粘贴图片的内容哈希，对应 SendHistory 图片库中的一项；无图片时为 None"""
+    kind: str
+    """输出类型：png / gif / apng / pages"""
+
+
+def image_digest(image: Image.Image) -> str:
+    """
+    计算图片内容（模式、尺寸与像素）的 SHA-1。
+    """
+    h = hashlib.sha1()
+    h.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class SendHistory:
+    """
+    固定容量的发送历史环。
+
+    图片按内容哈希去重，以 PNG 压缩字节存放，重发时再解码；最后一条引用它的记录被挤出时
+    随之释放。压缩后的图片总字节数超过 max_bytes 时从最旧的记录开始淘汰。
+    占用出现在内存报告中，但不计入全局缓存预算。
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        max_bytes: int = 16 * 1024 * 1024,
+        budget: Optional[MemoryBudget] = None,
+    ) -> None:
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._entries: Deque[HistoryEntry] = deque()
+        # 内容哈希 -> (PNG 字节, 引用计数)
+        self._images: Dict[str, Tuple[bytes, int]] = {}
+        self._image_bytes = 0
+        self._lock = threading.Lock()
+        (budget or get_budget()).register_tracker("history", self.usage)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _release(self, entry: HistoryEntry) -> None:
+        if entry.image_hash is None:
+            return
+        data, refs = self._images[entry.image_hash]
+        if refs > 1:
+            self._images[entry.image_hash] = (data, refs - 1)
+        else:
+            del self._images[entry.image_hash]
+            self._image_bytes -= len(data)
+
+    def record(
+        self, text: str, emotion: str, image: Optional[Image.Image], kind: str
+    ) -> Optional[HistoryEntry]:
+        """
+        记录一次发送并返回对应的记录；容量为 0 时不记录。
+
+        与已有记录完全相同时只把它移到最前，不重复保存。图片压缩后仍超过 max_bytes 时
+        无法重发，整条记录都不保存，返回 None。
+        """
+        if self.capacity <= 0:
+            return None
+        image_hash = image_digest(image) if image is not None else None
+        entry = HistoryEntry(text, emotion, image_hash, kind)
+        with self._lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+                self._entries.appendleft(entry)
+                return entry
+            stored = self._images.get(image_hash) if image_hash is not None else None
+
+        data = None
+        if image is not None and stored is None:
+            # 在锁外压缩；调用方之后可以自由关闭原图
+            buf = BytesIO()
+            image.save(buf, format="PNG", compress_level=1)
+            data = buf.getvalue()
+            if len(data) > self.max_bytes:
+                return None
+
+        with self._lock:
+            if image_hash is not None:
+                stored = self._images.get(image_hash)
+                if stored is not None:
+                    self._images[image_hash] = (stored[0], stored[1] + 1)
+                elif data is not None:
+                    self._images[image_hash] = (data, 1)
+                    self._image_bytes += len(data)
+                else:
+                    # 压缩期间同一图片已被淘汰，不再保存这条记录
+                    return None
+
+            self._entries.appendleft(entry)
+            while len(self._entries) > self.capacity or (
+                self._image_bytes > self.max_bytes and len(self._entries) > 1
+            ):
+                self._release(self._entries.pop())
+        return entry
+
+    def get(self, index: int = 0) -> Optional[Tuple[HistoryEntry, Optional[Image.Image]]]:
+        """
+        返回第 index 条（0 为最近一次）记录及其解码后的图片；不存在时返回 None。
+        """
+        with self._lock:
+            if not 0 <= index < len(self._entries):
+                return None
+            entry = self._entries[index]
+            data = None
+            if entry.image_hash is not None:
+                data = self._images[entry.image_hash][0]
+        image = None
+        if data is not None:
+            image = Image.open(BytesIO(data))
+            image.load()
+        return entry, image
+
+    def entries(self) -> List[HistoryEntry]:
+        with self._lock:
+            return list(self._entries)
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        返回 (条目数, 字节数)，字节数包含去重后的压缩图片。
+        """
+        with self._lock:
+            nbytes = sum(estimate_size(e.text) for e in self._entries)
+            return len(self._entries), nbytes + self._image_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self._image_bytes = 0
+            self._entries.clear()
@@ -0,0 +1,267 @@
+# filename: text_animation.py
+from io import BytesIO
+from typing import List, Literal, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageDraw
+
+from asset_cache import open_canvas, open_overlay
+from text_fit_draw import (
+    Align,
+    FontLike,
+    FontSource,
+    RGBColor,
+    TextTiles,
+    VAlign,
+    fit_text,
+    layout_segments,
+    rasterize_text,
+    text_length,
+)
+from text_effects import TextEffects, apply_text_effects
+
+AnimationFormat = Literal["gif", "apng"]
+
+Box = Tuple[int, int, int, int]
+
+
+def _union(a: Optional[Box], b: Box) -> Box:
+    if a is None:
+        return b
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _clip(box: Box, size: Tuple[int, int]) -> Optional[Box]:
+    l, t = max(0, box[0]), max(0, box[1])
+    r, b = min(size[0], box[2]), min(size[1], box[3])
+    if r <= l or b <= t:
+        return None
+    return l, t, r, b
+
+
+def _reveal_boxes(
+    measure: ImageDraw.ImageDraw,
+    placed: List[Tuple[Tuple[int, int], str, RGBColor]],
+    tiles: TextTiles,
+    font: FontLike,
+) -> List[Box]:
+    """
+    为每个非空白字符计算它在覆盖图上的显露矩形（覆盖图坐标），按书写顺序排列。
+
+    矩形的左右边界取字符在整段中的累计前进宽度，上下边界取所在行的行带；
+    每行的首尾与首末行向外延伸到覆盖图边缘。
+    """
+    ox, oy = tiles.offset
+    tile_w, tile_h = tiles.size
+    line_ys = sorted({y for (_, y), _, _ in placed})
+
+    boxes: List[Box] = []
+    for index, y in enumerate(line_ys):
+        top = 0 if index == 0 else max(0, y - oy)
+        bottom = tile_h if index == len(line_ys) - 1 else min(tile_h, line_ys[index + 1] - oy)
+
+        # 本行各字符右边界
+        edges: List[float] = []
+        for (sx, sy), seg_text, _ in placed:
+            if sy != y:
+                continue
+            for i, ch in enumerate(seg_text):
+                if not ch.isspace():
+                    edges.append(sx + text_length(measure, seg_text[: i + 1], font) - ox)
+
+        left = 0
+        for i, edge in enumerate(edges):
+            right = tile_w if i == len(edges) - 1 else max(left, min(tile_w, round(edge)))
+            boxes.append((left, top, right, bottom))
+            left = right
+    return boxes
+
+
+def draw_text_animated(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: RGBColor = (0, 0, 0),
+    max_font_height: Optional[int] = None,
+    font_path: FontSource = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: RGBColor = (128, 0, 128),
+    image_overlay: Union[str, Image.Image, None] = None,
+    fmt: AnimationFormat = "gif",
+    frame_count: int = 30,
+    frame_duration: int = 60,
+    hold_duration: int = 1500,
+    effects: Optional[TextEffects] = None,
+) -> bytes:
+    """
+    生成文字逐步出现的打字机动画（GIF / APNG）。
+
+    文字使用与 draw_text_auto 相同的覆盖图（rasterize_text），每帧只显露新字符所在的
+    矩形，最后一帧与静态图完全一致。字符平均分配到 frame_count 帧中，字符数少于帧数时
+    部分帧不出现新字符。GIF 只对变化的矩形做调色板量化，所有帧共用同一调色板；
+    APNG 保持真彩色。
+
+    传入 effects 时描边 / 投影随已显露的文字一起出现，变化的矩形相应向外扩展效果范围。
+
+    : param fmt: "gif" 或 "apng"
+    : param frame_count: 文字出现过程的帧数（不含首帧空白）
+    : param frame_duration: 每帧时长（毫秒）
+    : param hold_duration: 最后一帧停留时长（毫秒）
+    : param effects: 文字描边 / 投影，与静态图使用相同的参数
+    """
+    canvas = open_canvas(image_source)
+    img_overlay = open_overlay(image_overlay)
+
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    if not (x2 > x1 and y2 > y1):
+        raise ValueError("无效的文字区域。")
+    region_w, region_h = x2 - x1, y2 - y1
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    layout = fit_text(
+        measure, text, region_w, region_h, font_path, max_font_height, line_spacing
+    )
+    tiles = rasterize_text(
+        layout, region_w, region_h, color, bracket_color, align, valign
+    )
+    tx, ty = x1 + tiles.offset[0], y1 + tiles.offset[1]
+    boxes: List[Box] = []
+    if tiles.runs:
+        placed = layout_segments(
+            measure, layout, (0, 0), (region_w, region_h), color, bracket_color, align, valign
+        )
+        boxes = _reveal_boxes(measure, placed, tiles, layout.font)
+
+    # 已显露区域的蒙版（覆盖图坐标），每帧按它从原始底图重新合成变化的矩形
+    revealed = Image.new("L", tiles.size, 0)
+    # 有效果时另存已显露文字的覆盖图，描边 / 投影由它计算
+    use_effects = effects is not None and effects.enabled and bool(tiles.runs)
+    margin = effects.margin if use_effects else 0
+    coverage = tiles.coverage() if use_effects else None
+    shown_coverage = Image.new("L", tiles.size, 0) if use_effects else None
+
+    def with_overlay(img: Image.Image, box: Box) -> Image.Image:
+        if img_overlay is not None:
+            img.paste(img_overlay.crop(box), (0, 0), img_overlay.crop(box))
+        return img
+
+    def to_canvas(tile_box: Box, pad: int) -> Optional[Box]:
+        return _clip(
+            (
+                tx + tile_box[0] - pad,
+                ty + tile_box[1] - pad,
+                tx + tile_box[2] + pad,
+                ty + tile_box[3] + pad,
+            ),
+            canvas.size,
+        )
+
+    def paint(
+        tile_box: Box, reveal: Image.Image, shown: Optional[Image.Image]
+    ) -> Optional[Tuple[Box, Image.Image]]:
+        """按显露蒙版 reveal 与已显露覆盖图 shown 从原始底图合成 tile_box 及其效果范围。"""
+        box = to_canvas(tile_box, margin)
+        if box is None:
+            return None
+        # 效果的滤波需要再多一圈上下文，合成后只取内圈
+        work = to_canvas(tile_box, 2 * margin) if margin else box
+        patch = canvas.crop(work)
+        if shown is not None:
+            cov = Image.new("L", patch.size, 0)
+            cov.paste(shown, (tx - work[0], ty - work[1]))
+            apply_text_effects(patch, cov, (0, 0) + patch.size, effects)
+        local = _clip((work[0] - tx, work[1] - ty, work[2] - tx, work[3] - ty), tiles.size)
+        if local is not None:
+            at = (local[0] + tx - work[0], local[1] + ty - work[1])
+            mask_reveal = reveal.crop(local)
+            for run_color, mask in tiles.runs:
+                patch.paste(run_color, at, ImageChops.multiply(mask.crop(local), mask_reveal))
+        if work != box:
+            patch = patch.crop(
+                (box[0] - work[0], box[1] - work[1], box[2] - work[0], box[3] - work[1])
+            )
+        return box, patch
+
+    def compose(tile_box: Box) -> Optional[Tuple[Box, Image.Image]]:
+        painted = paint(tile_box, revealed, shown_coverage)
+        if painted is None:
+            return None
+        box, patch = painted
+        return box, with_overlay(patch, box)
+
+    full_box = (0, 0) + canvas.size
+    gif = fmt == "gif"
+    palette_img: Optional[Image.Image] = None
+    if gif:
+        # 共享调色板：从最终画面量化得到，保证所有文字颜色都在调色板内
+        final = canvas.copy()
+        if tiles.runs:
+            painted = paint((0, 0) + tiles.size, Image.new("L", tiles.size, 255), coverage)
+            if painted is not None:
+                final.paste(painted[1], painted[0][:2])
+        with_overlay(final, full_box)
+        palette_img = final.convert("RGB").quantize(colors=256)
+        final.close()
+
+    def encode(img: Image.Image) -> Image.Image:
+        if palette_img is None:
+            return img
+        return img.convert("RGB").quantize(palette=palette_img, dither=Image.Dither.NONE)
+
+    # 首帧：不含文字的底图
+    frame = encode(with_overlay(canvas.copy(), full_box))
+    frames = [frame.copy()]
+
+    steps = max(1, frame_count)
+    shown = 0
+    for step in range(1, steps + 1):
+        upto = len(boxes) * step // steps
+        dirty: Optional[Box] = None
+        for box in boxes[shown:upto]:
+            revealed.paste(255, box)
+            if shown_coverage is not None:
+                shown_coverage.paste(coverage.crop(box), box[:2])
+            dirty = _union(dirty, box)
+        shown = upto
+        if step == steps and tiles.runs:
+            # 最后一帧显露整张覆盖图，保证与静态图一致
+            revealed.paste(255, (0, 0) + tiles.size)
+            if shown_coverage is not None:
+                shown_coverage.paste(coverage, (0, 0))
+            dirty = (0, 0) + tiles.size
+        if dirty is not None:
+            composed = compose(dirty)
+            if composed is not None:
+                box, patch = composed
+                frame.paste(encode(patch), box[:2])
+        frames.append(frame.copy())
+    durations = [frame_duration] * len(frames)
+    durations[-1] = hold_duration
+
+    buf = BytesIO()
+    if gif:
+        frames[0].save(
+            buf,
+            format="GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=0,
+            disposal=1,
+            optimize=False,
+        )
+    else:
+        frames[0].save(
+            buf,
+            format="PNG",
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations,
+            loop=0,
+            disposal=0,
+            blend=0,
+        )
+    return buf.getvalue()
@@ -0,0 +1,90 @@
+# filename: text_effects.py
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageFilter
+
+RGBColor = Tuple[int, int, int]
+
+Box = Tuple[int, int, int, int]
+
+
+class TextEffects(NamedTuple):
+    """
+    文字描边与投影设置。描边宽度为 0 时不描边，投影不透明度为 0 时不投影。
+    """
+
+    outline_width: int = 0
+    outline_color: RGBColor = (255, 255, 255)
+    shadow_offset: Tuple[int, int] = (2, 2)
+    shadow_blur: int = 2
+    shadow_color: RGBColor = (0, 0, 0)
+    shadow_opacity: float = 0.0
+
+    @property
+    def has_outline(self) -> bool:
+        return self.outline_width > 0
+
+    @property
+    def has_shadow(self) -> bool:
+        return self.shadow_opacity > 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.has_outline or self.has_shadow
+
+    @property
+    def margin(self) -> int:
+        """
+        效果超出文字覆盖范围的最大距离。
+        """
+        m = self.outline_width
+        if self.has_shadow:
+            dx, dy = self.shadow_offset
+            m += max(abs(dx), abs(dy)) + self.shadow_blur * 3
+        return m
+
+
+def effect_bounds(
+    effects: TextEffects, region: Box, canvas_size: Tuple[int, int]
+) -> Optional[Box]:
+    """
+    返回文字区域向外扩展效果范围后、裁剪到画布内的矩形。
+    """
+    margin = effects.margin
+    left = max(0, region[0] - margin)
+    top = max(0, region[1] - margin)
+    right = min(canvas_size[0], region[2] + margin)
+    bottom = min(canvas_size[1], region[3] + margin)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def apply_text_effects(
+    img: Image.Image, coverage: Image.Image, box: Box, effects: TextEffects
+) -> None:
+    """
+    在绘制文字之前，把投影和描边合成到 img 的 box 区域上。
+
+    coverage 为 box 大小的单通道文字覆盖蒙版（每行文字只绘制一次）。描边为蒙版的
+    最大值滤波（膨胀），投影为（描边后）蒙版平移后的盒式模糊，各自以纯色一次性合成。
+    """
+    silhouette = coverage
+    if effects.has_outline:
+        silhouette = silhouette.filter(
+            ImageFilter.MaxFilter(2 * effects.outline_width + 1)
+        )
+
+    if effects.has_shadow:
+        dx, dy = effects.shadow_offset
+        shadow = Image.new("L", silhouette.size, 0)
+        shadow.paste(silhouette, (dx, dy))
+        if effects.shadow_blur > 0:
+            shadow = shadow.filter(ImageFilter.BoxBlur(effects.shadow_blur))
+        opacity = max(0.0, min(1.0, effects.shadow_opacity))
+        if opacity < 1:
+            shadow = shadow.point(lambda v: int(v * opacity))
+        img.paste(tuple(effects.shadow_color), box, shadow)
+
+    if effects.has_outline:
+        img.paste(tuple(effects.outline_color), box, silhouette)
@@ -1,20 +1,57 @@
 # filename: text_fit_draw.py
 import os
 from io import BytesIO
-from typing import List, Literal, Optional, Tuple, Union
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from asset_cache import open_canvas, open_overlay, paste_overlay
+from font_fallback import FallbackFont, get_chain
+from memory_budget import BudgetedCache
+from text_effects import TextEffects, apply_text_effects, effect_bounds
 
 RGBColor = Tuple[int, int, int]
 
+# 单个字体路径，或按优先级排列的回退字体路径序列
+FontSource = Union[str, Sequence[str], None]
+FontLike = Union[ImageFont.FreeTypeFont, FallbackFont]
+
 Align = Literal["left", "center", "right"]
 VAlign = Literal["top", "middle", "bottom"]
 
+# 字体对象、文本宽度测量结果与文字覆盖图缓存，计入全局内存预算
+_font_cache = BudgetedCache("fonts")
+_glyph_cache = BudgetedCache("glyphs")
+_tile_cache = BudgetedCache("text_tiles")
 
-def _load_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+
+def load_font(font_path: FontSource, size: int) -> FontLike:
     """
-    加载指定路径的字体文件，如果失败则加载默认字体。
+    加载指定路径的字体文件（带缓存），如果失败则加载默认字体。
+
+    font_path 为多个路径时返回按码位覆盖表回退的 FallbackFont。
     """
+    if font_path is not None and not isinstance(font_path, str):
+        paths = tuple(font_path)
+        if len(paths) > 1:
+            key = (paths, size)
+            font = _font_cache.get(key)
+            if font is None:
+                fonts = [load_font(p, size) for p in paths]
+                font = FallbackFont(get_chain(paths), fonts, size)  # type: ignore
+                _font_cache.put(key, font)
+            return font
+        font_path = paths[0] if paths else None
+
+    key = (font_path, size)
+    font = _font_cache.get(key)
+    if font is None:
+        font = _open_font(font_path, size)
+        _font_cache.put(key, font)
+    return font
+
+
+def _open_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
     if font_path and os.path.exists(font_path):
         return ImageFont.truetype(font_path, size=size)
     try:
@@ -23,8 +60,63 @@ def _load_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
         return ImageFont.load_default()  # type: ignore # 如果没有可用的 TTF 字体，则加载默认位图字体
 
 
+def text_length(draw: ImageDraw.ImageDraw, txt: str, font: FontLike) -> float:
+    """
+    测量文本宽度（带缓存）；回退字体按字体片段分别测量后求和。
+    """
+    key = (getattr(font, "path", None), getattr(font, "size", None), txt)
+    w = _glyph_cache.get(key)
+    if w is None:
+        if isinstance(font, FallbackFont):
+            w = sum(draw.textlength(seg, font=f) for seg, f in font.runs(txt))
+        else:
+            w = draw.textlength(txt, font=font)
+        _glyph_cache.put(key, w, 64 + 2 * len(txt))
+    return w
+
+
+def draw_string(
+    draw: ImageDraw.ImageDraw,
+    xy: Tuple[int, int],
+    txt: str,
+    font: FontLike,
+    fill: Union[RGBColor, int],
+) -> None:
+    """
+    在 xy（行顶部）处绘制一段文本；回退字体的各片段按公共基线对齐。
+    """
+    if not isinstance(font, FallbackFont):
+        draw.text(xy, txt, font=font, fill=fill)
+        return
+    x, y = xy
+    baseline = y + font.ascent
+    for seg, f in font.runs(txt):
+        draw.text((x, baseline), seg, font=f, fill=fill, anchor="ls")
+        x += draw.textlength(seg, font=f)
+
+
+def string_bbox(
+    draw: ImageDraw.ImageDraw, xy: Tuple[int, int], txt: str, font: FontLike
+) -> Tuple[int, int, int, int]:
+    """
+    返回 draw_string 绘制该文本时覆盖的矩形。
+    """
+    if not isinstance(font, FallbackFont):
+        return tuple(draw.textbbox(xy, txt, font=font))  # type: ignore
+    x, y = xy
+    baseline = y + font.ascent
+    box = None
+    for seg, f in font.runs(txt):
+        l, t, r, b = draw.textbbox((x, baseline), seg, font=f, anchor="ls")
+        box = (l, t, r, b) if box is None else (
+            min(box[0], l), min(box[1], t), max(box[2], r), max(box[3], b)
+        )
+        x += draw.textlength(seg, font=f)
+    return box or (x, y, x, y)  # type: ignore
+
+
 def wrap_lines(
-    draw: ImageDraw.ImageDraw, txt: str, font: ImageFont.FreeTypeFont, max_w: int
+    draw: ImageDraw.ImageDraw, txt: str, font: FontLike, max_w: int
 ) -> List[str]:
     """
     将文本按指定宽度拆分为多行。
@@ -43,7 +135,7 @@ def wrap_lines(
 
         for u in units:
             trial = unit_join(buf, u)
-            w = draw.textlength(trial, font=font)
+            w = text_length(draw, trial, font)
 
             # 如果加入当前单元后宽度未超限，则继续累积
             if w <= max_w:
@@ -58,7 +150,7 @@ def wrap_lines(
             if has_space and len(u) > 1:
                 tmp = ""
                 for ch in u:
-                    if draw.textlength(tmp + ch, font=font) <= max_w:
+                    if text_length(draw, tmp + ch, font) <= max_w:
                         tmp += ch
                         continue
 
@@ -68,7 +160,7 @@ def wrap_lines(
                 buf = tmp
                 continue
 
-            if draw.textlength(u, font=font) <= max_w:
+            if text_length(draw, u, font) <= max_w:
                 buf = u
             else:
                 lines.append(u)
@@ -112,7 +204,7 @@ def parse_color_segments(
 def measure_block(
     draw: ImageDraw.ImageDraw,
     lines: List[str],
-    font: ImageFont.FreeTypeFont,
+    font: FontLike,
     line_spacing: float,
 ) -> Tuple[int, int, int]:
     """
@@ -124,62 +216,41 @@ def measure_block(
     line_h = int((ascent + descent) * (1 + line_spacing))
     max_w = 0
     for ln in lines:
-        max_w = max(max_w, int(draw.textlength(ln, font=font)))
+        max_w = max(max_w, int(text_length(draw, ln, font)))
     total_h = max(line_h * max(1, len(lines)), 1)
     return max_w, total_h, line_h
 
 
-def draw_text_auto(
-    image_source: Union[str, Image.Image],
-    top_left: Tuple[int, int],
-    bottom_right: Tuple[int, int],
-    text: str,
-    color: RGBColor = (0, 0, 0),
-    max_font_height: Optional[int] = None,
-    font_path: Optional[str] = None,
-    align: Align = "center",
-    valign: VAlign = "middle",
-    line_spacing: float = 0.15,
-    bracket_color: RGBColor = (128, 0, 128),  # 中括号及内部内容颜色
-    image_overlay: Union[str, Image.Image, None] = None,
-) -> bytes:
+class TextLayout(NamedTuple):
     """
-    在指定矩形内自适应字号绘制文本；
-    中括号及括号内文字使用 bracket_color。
+    自适应字号搜索的结果。
     """
 
-    # --- 1. 打开图像 ---
-    if isinstance(image_source, Image.Image):
-        img = image_source.copy()
-    else:
-        img = Image.open(image_source).convert("RGBA")
-    draw = ImageDraw.Draw(img)
-
-    if image_overlay is not None:
-        if isinstance(image_overlay, Image.Image):
-            img_overlay = image_overlay.copy()
-        else:
-            img_overlay = (
-                Image.open(image_overlay).convert("RGBA")
-                if os.path.isfile(image_overlay)
-                else None
-            )
-    else:
-        img_overlay = None
+    font: FontLike
+    font_size: int
+    lines: List[str]
+    line_h: int
+    block_h: int
 
-    x1, y1 = top_left
-    x2, y2 = bottom_right
-    if not (x2 > x1 and y2 > y1):
-        raise ValueError("无效的文字区域。")
-    region_w, region_h = x2 - x1, y2 - y1
 
-    # --- 2. 搜索最大字号 ---
+def fit_text(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    region_w: int,
+    region_h: int,
+    font_path: FontSource = None,
+    max_font_height: Optional[int] = None,
+    line_spacing: float = 0.15,
+) -> TextLayout:
+    """
+    二分搜索能放入区域的最大字号，返回换行结果与行高。
+    """
     hi = min(region_h, max_font_height) if max_font_height else region_h
     lo, best_size, best_lines, best_line_h, best_block_h = 1, 0, [], 0, 0
 
     while lo <= hi:
         mid = (lo + hi) // 2
-        font = _load_font(font_path, mid)
+        font = load_font(font_path, mid)
         lines = wrap_lines(draw, text, font, region_w)
         w, h, lh = measure_block(draw, lines, font, line_spacing)
         if w <= region_w and h <= region_h:
@@ -189,26 +260,51 @@ def draw_text_auto(
             hi = mid - 1
 
     if best_size == 0:
-        font = _load_font(font_path, 1)
+        font = load_font(font_path, 1)
         best_lines = wrap_lines(draw, text, font, region_w)
         best_block_h, best_line_h = 1, 1
         best_size = 1
     else:
-        font = _load_font(font_path, best_size)
+        font = load_font(font_path, best_size)
+
+    return TextLayout(font, best_size, best_lines, best_line_h, best_block_h)
 
-    # --- 3. 垂直对齐 ---
+
+def layout_segments(
+    draw: ImageDraw.ImageDraw,
+    layout: TextLayout,
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    color: RGBColor = (0, 0, 0),
+    bracket_color: RGBColor = (128, 0, 128),
+    align: Align = "center",
+    valign: VAlign = "middle",
+    in_bracket: bool = False,
+) -> List[Tuple[Tuple[int, int], str, RGBColor]]:
+    """
+    按对齐方式计算每个颜色片段的绘制坐标。
+
+    in_bracket 为文本开头是否处于中括号内（分页时由上一页延续）。
+
+    :return: [((x, y), 片段文本, 片段颜色), ...]
+    """
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    region_w, region_h = x2 - x1, y2 - y1
+    font = layout.font
+
+    # 垂直对齐
     if valign == "top":
         y_start = y1
     elif valign == "middle":
-        y_start = y1 + (region_h - best_block_h) // 2
+        y_start = y1 + (region_h - layout.block_h) // 2
     else:
-        y_start = y2 - best_block_h
+        y_start = y2 - layout.block_h
 
-    # --- 4. 绘制 ---
+    placed: List[Tuple[Tuple[int, int], str, RGBColor]] = []
     y = y_start
-    in_bracket = False
-    for ln in best_lines:
-        line_w = int(draw.textlength(ln, font=font))
+    for ln in layout.lines:
+        line_w = int(text_length(draw, ln, font))
         if align == "left":
             x = x1
         elif align == "center":
@@ -220,19 +316,216 @@ def draw_text_auto(
         )
         for seg_text, seg_color in segments:
             if seg_text:
-                draw.text((x, y), seg_text, font=font, fill=seg_color)
-                x += int(draw.textlength(seg_text, font=font))
-        y += best_line_h
+                placed.append(((x, y), seg_text, seg_color))
+                x += int(text_length(draw, seg_text, font))
+        y += layout.line_h
         if y - y_start > region_h:
             break
+    return placed
+
+
+class TextTiles(NamedTuple):
+    """
+    文字的单通道覆盖图：每种颜色一张 "L" 图，只覆盖文字实际占用的矩形。
+
+    与底图无关，同一区域大小下可在不同差分之间复用。
+    """
+
+    offset: Tuple[int, int]
+    """覆盖图左上角相对文字区域左上角的偏移"""
+    size: Tuple[int, int]
+    runs: List[Tuple[RGBColor, Image.Image]]
+    """[(颜色, 覆盖图), ...]"""
+
+    def coverage(self) -> Image.Image:
+        """
+        合并所有颜色的覆盖图。
+        """
+        merged = self.runs[0][1]
+        for _, mask in self.runs[1:]:
+            merged = ImageChops.lighter(merged, mask)
+        return merged
+
+
+def rasterize_text(
+    layout: TextLayout,
+    region_w: int,
+    region_h: int,
+    color: RGBColor = (0, 0, 0),
+    bracket_color: RGBColor = (128, 0, 128),
+    align: Align = "center",
+    valign: VAlign = "middle",
+    in_bracket: bool = False,
+) -> TextTiles:
+    """
+    把排版结果按颜色绘制到单通道覆盖图上（带缓存）。
+
+    坐标相对于文字区域左上角，因此结果只取决于排版、区域大小与颜色，与底图和区域位置无关。
+    """
+    font = layout.font
+    key = (
+        getattr(font, "path", None) or font,
+        layout.font_size,
+        tuple(layout.lines),
+        layout.line_h,
+        layout.block_h,
+        region_w,
+        region_h,
+        tuple(color),
+        tuple(bracket_color),
+        align,
+        valign,
+        in_bracket,
+    )
+    tiles = _tile_cache.get(key)
+    if tiles is not None:
+        return tiles
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    placed = layout_segments(
+        measure,
+        layout,
+        (0, 0),
+        (region_w, region_h),
+        color,
+        bracket_color,
+        align,
+        valign,
+        in_bracket,
+    )
+    box: Optional[Tuple[int, int, int, int]] = None
+    for pos, seg_text, _ in placed:
+        l, t, r, b = string_bbox(measure, pos, seg_text, font)
+        box = (l, t, r, b) if box is None else (
+            min(box[0], l), min(box[1], t), max(box[2], r), max(box[3], b)
+        )
+
+    if box is None or box[2] <= box[0] or box[3] <= box[1]:
+        tiles = TextTiles((0, 0), (0, 0), [])
+    else:
+        left, top = int(box[0]), int(box[1])
+        size = (int(box[2]) - left + 1, int(box[3]) - top + 1)
+        draws: Dict[RGBColor, ImageDraw.ImageDraw] = {}
+        masks: Dict[RGBColor, Image.Image] = {}
+        for (px, py), seg_text, seg_color in placed:
+            seg_color = tuple(seg_color)  # type: ignore
+            if seg_color not in masks:
+                masks[seg_color] = Image.new("L", size, 0)
+                draws[seg_color] = ImageDraw.Draw(masks[seg_color])
+            draw_string(draws[seg_color], (px - left, py - top), seg_text, font, 255)
+        tiles = TextTiles((left, top), size, list(masks.items()))
+
+    _tile_cache.put(key, tiles, 256 + tiles.size[0] * tiles.size[1] * len(tiles.runs))
+    return tiles
+
+
+def render_text_image(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: RGBColor = (0, 0, 0),
+    max_font_height: Optional[int] = None,
+    font_path: FontSource = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: RGBColor = (128, 0, 128),  # 中括号及内部内容颜色
+    image_overlay: Union[str, Image.Image, None] = None,
+    layout: Optional[TextLayout] = None,
+    effects: Optional[TextEffects] = None,
+    in_bracket: bool = False,
+) -> Image.Image:
+    """
+    与 draw_text_auto 相同，但返回未编码的图像。
+
+    传入 layout 时跳过字号搜索，直接使用已有的排版结果（区域相同的多张底图可共用）。
+    传入 effects 时先合成文字描边 / 投影。in_bracket 表示文本开头已处于中括号内。
+    """
+
+    # --- 1. 打开图像 ---
+    img = open_canvas(image_source)
+    img_overlay = open_overlay(image_overlay)
+
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    if not (x2 > x1 and y2 > y1):
+        raise ValueError("无效的文字区域。")
+    region_w, region_h = x2 - x1, y2 - y1
+
+    # --- 2. 搜索最大字号 ---
+    if layout is None:
+        measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+        layout = fit_text(
+            measure, text, region_w, region_h, font_path, max_font_height, line_spacing
+        )
+
+    # --- 3. 在单通道覆盖图上绘制文字，再按颜色一次性合成到底图 ---
+    tiles = rasterize_text(
+        layout, region_w, region_h, color, bracket_color, align, valign, in_bracket
+    )
+    if tiles.runs:
+        tx, ty = x1 + tiles.offset[0], y1 + tiles.offset[1]
+        tile_box = (tx, ty, tx + tiles.size[0], ty + tiles.size[1])
+        if effects is not None and effects.enabled:
+            box = effect_bounds(effects, tile_box, img.size)
+            if box is not None:
+                # 描边与投影都由合并后的覆盖图计算
+                coverage = Image.new("L", (box[2] - box[0], box[3] - box[1]), 0)
+                coverage.paste(tiles.coverage(), (tx - box[0], ty - box[1]))
+                apply_text_effects(img, coverage, box, effects)
+        for run_color, mask in tiles.runs:
+            img.paste(run_color, tile_box, mask)
 
     # 覆盖置顶图层（如果有）
     if image_overlay is not None and img_overlay is not None:
-        img.paste(img_overlay, (0, 0), img_overlay)
+        paste_overlay(img, img_overlay)
     elif image_overlay is not None and img_overlay is None:
         print("Warning: overlay image is not exist.")
 
-    # --- 5. 输出 PNG ---
+    return img
+
+
+def draw_text_auto(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: RGBColor = (0, 0, 0),
+    max_font_height: Optional[int] = None,
+    font_path: FontSource = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: RGBColor = (128, 0, 128),  # 中括号及内部内容颜色
+    image_overlay: Union[str, Image.Image, None] = None,
+    layout: Optional[TextLayout] = None,
+    effects: Optional[TextEffects] = None,
+    in_bracket: bool = False,
+) -> bytes:
+    """
+    在指定矩形内自适应字号绘制文本；
+    中括号及括号内文字使用 bracket_color。
+    """
+    img = render_text_image(
+        image_source,
+        top_left,
+        bottom_right,
+        text,
+        color,
+        max_font_height,
+        font_path,
+        align,
+        valign,
+        line_spacing,
+        bracket_color,
+        image_overlay,
+        layout,
+        effects,
+        in_bracket,
+    )
+
+    # --- 4. 输出 PNG ---
     buf = BytesIO()
     img.save(buf, format="PNG")
     return buf.getvalue()
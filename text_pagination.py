@@ -0,0 +1,260 @@
+# filename: text_pagination.py
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, List, Literal, Optional, Sequence, Tuple, TypeVar, Union
+
+from PIL import Image, ImageDraw
+
+from text_effects import TextEffects
+from text_fit_draw import (
+    Align,
+    FontSource,
+    RGBColor,
+    VAlign,
+    draw_text_auto,
+    fit_text,
+    load_font,
+    measure_block,
+    parse_color_segments,
+    wrap_lines,
+)
+
+PageDelivery = Literal["sequence", "stack"]
+
+T = TypeVar("T")
+
+# 适合作为分页断点的句末标点；"." 只在其后为空白或行尾（词尾）时才算
+_SENTENCE_ENDS = "。！？；…!?;.~～"
+
+# 句末标点之后应留在同一页的闭合引号与括号
+_CLOSING_MARKS = "」』”’）)】]\"'"
+
+# 寻找断点时最多回退的行数占每页行数的比例
+_BREAK_LOOKBACK = 0.34
+
+
+def _join_lines(lines: List[Tuple[int, str, str]]) -> str:
+    """
+    将 (段落序号, 行文本, 与下一行之间的分隔符) 还原为文本；同一段落内的行按分隔符重新拼接。
+    """
+    out = ""
+    prev_para = None
+    joiner = ""
+    for para, ln, sep in lines:
+        if prev_para is None:
+            out = ln
+        elif para != prev_para:
+            out += "\n" + ln
+        else:
+            out += joiner + ln
+        prev_para, joiner = para, sep
+    return out
+
+
+def _line_separators(para: str, wrapped: List[str]) -> List[str]:
+    """
+    返回每个换行结果与下一行之间原本的分隔符：行尾原为空格时为 " "，
+    按字符拆开的长单词（如网址）或中文换行处为 ""。
+    """
+    seps: List[str] = []
+    cursor = 0
+    for ln in wrapped:
+        if para.startswith(ln, cursor):
+            cursor += len(ln)
+        else:
+            # 无法定位时退回旧的判断方式
+            found = para.find(ln, cursor)
+            cursor = found + len(ln) if found >= 0 else cursor
+        if cursor < len(para) and para[cursor] == " ":
+            seps.append(" ")
+            cursor += 1
+        else:
+            seps.append("")
+    return seps
+
+
+def _sentence_break(line: str, at_word_end: bool) -> int:
+    """
+    返回行内最后一个句末标点（含其后的闭合引号 / 括号）之后的位置，没有时返回 -1。
+
+    "." 之后必须是空白，或位于行尾且行尾原本就是词尾（at_word_end），
+    以免在网址、小数和文件名中间断开。
+    """
+    for pos in range(len(line) - 1, -1, -1):
+        if line[pos] not in _SENTENCE_ENDS:
+            continue
+        end = pos + 1
+        while end < len(line) and line[end] in _CLOSING_MARKS:
+            end += 1
+        if line[pos] == ".":
+            if end < len(line) and not line[end].isspace():
+                continue
+            if end == len(line) and not at_word_end:
+                continue
+        return end
+    return -1
+
+
+def paginate_text(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    region_w: int,
+    region_h: int,
+    font_path: FontSource = None,
+    min_font_size: int = 16,
+    max_font_height: Optional[int] = None,
+    line_spacing: float = 0.15,
+) -> List[str]:
+    """
+    将文本拆分为若干页，使每页都能以不小于 min_font_size 的字号放入区域。
+
+    文本在最大字号下已经不小于 min_font_size 时只返回一页。否则以 min_font_size
+    换行，每页尽量在段落末尾或句末标点处断开（必要时把一行从标点处拆开），
+    都找不到时才在行末断开。
+    """
+    layout = fit_text(
+        draw, text, region_w, region_h, font_path, max_font_height, line_spacing
+    )
+    if layout.font_size >= min_font_size:
+        return [text]
+
+    font = load_font(font_path, min_font_size)
+    _, _, line_h = measure_block(draw, [""], font, line_spacing)
+    per_page = max(1, region_h // max(1, line_h))
+
+    # 逐段换行，记录每行所属段落，以便分页后还原文本
+    lines: List[Tuple[int, str, str]] = []
+    for para_index, para in enumerate(text.splitlines() or [""]):
+        wrapped = wrap_lines(draw, para, font, region_w)
+        for ln, sep in zip(wrapped, _line_separators(para, wrapped)):
+            lines.append((para_index, ln, sep))
+
+    pages: List[str] = []
+    start = 0
+    while start < len(lines):
+        end = min(len(lines), start + per_page)
+        if end < len(lines):
+            # 从本页最后一行往前寻找段落结束或句末标点作为断点
+            lookback = max(1, int(per_page * _BREAK_LOOKBACK))
+            for i in range(end - 1, max(start, end - 1 - lookback) - 1, -1):
+                para, ln, sep = lines[i]
+                if lines[i + 1][0] != para:
+                    end = i + 1
+                    break
+                pos = _sentence_break(ln, sep == " ")
+                if pos < 0:
+                    continue
+                head, tail = ln[:pos], ln[pos:].lstrip()
+                if tail:
+                    # 标点在行中间：拆成两行，后半行留给下一页
+                    head_sep = " " if ln[pos:pos + 1].isspace() else ""
+                    lines[i] = (para, head, head_sep)
+                    lines.insert(i + 1, (para, tail, sep))
+                end = i + 1
+                break
+        page = _join_lines(lines[start:end]).strip("\n")
+        if page.strip():
+            pages.append(page)
+        start = end
+    return pages or [text]
+
+
+def render_pages(
+    pages: Sequence[T],
+    render: Callable[[T], bytes],
+    max_workers: Optional[int] = None,
+) -> List[bytes]:
+    """
+    在线程池中并发渲染各页，结果保持原顺序。
+    """
+    if len(pages) == 1:
+        return [render(pages[0])]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page") as pool:
+        return list(pool.map(render, pages))
+
+
+def stack_pages(pages: List[bytes], spacing: int = 0) -> bytes:
+    """
+    将多页 PNG 纵向拼接为一张图片。
+    """
+    images = [Image.open(BytesIO(p)) for p in pages]
+    width = max(im.width for im in images)
+    height = sum(im.height for im in images) + spacing * (len(images) - 1)
+    sheet = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    y = 0
+    for im in images:
+        sheet.paste(im, ((width - im.width) // 2, y))
+        y += im.height + spacing
+        im.close()
+
+    buf = BytesIO()
+    sheet.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def draw_text_paginated(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: str,
+    color: RGBColor = (0, 0, 0),
+    max_font_height: Optional[int] = None,
+    font_path: FontSource = None,
+    align: Align = "center",
+    valign: VAlign = "middle",
+    line_spacing: float = 0.15,
+    bracket_color: RGBColor = (128, 0, 128),
+    image_overlay: Union[str, Image.Image, None] = None,
+    effects: Optional[TextEffects] = None,
+    min_font_size: int = 16,
+    max_workers: Optional[int] = None,
+) -> List[bytes]:
+    """
+    长文本分页绘制：每页字号不小于 min_font_size，各页在线程池中并发渲染。
+
+    返回每页的 PNG 字节，顺序与文本顺序一致。
+    """
+    x1, y1 = top_left
+    x2, y2 = bottom_right
+    if not (x2 > x1 and y2 > y1):
+        raise ValueError("无效的文字区域。")
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    pages = paginate_text(
+        measure,
+        text,
+        x2 - x1,
+        y2 - y1,
+        font_path,
+        min_font_size,
+        max_font_height,
+        line_spacing,
+    )
+
+    # 中括号跨页时，下一页开头沿用上一页结尾的括号状态
+    page_states: List[Tuple[str, bool]] = []
+    in_bracket = False
+    for page in pages:
+        page_states.append((page, in_bracket))
+        _, in_bracket = parse_color_segments(page, in_bracket, bracket_color, color)
+
+    def render(page_state: Tuple[str, bool]) -> bytes:
+        page, page_in_bracket = page_state
+        return draw_text_auto(
+            image_source=image_source,
+            top_left=top_left,
+            bottom_right=bottom_right,
+            text=page,
+            color=color,
+            max_font_height=max_font_height,
+            font_path=font_path,
+            align=align,
+            valign=valign,
+            line_spacing=line_spacing,
+            bracket_color=bracket_color,
+            image_overlay=image_overlay,
+            effects=effects,
+            in_bracket=page_in_bracket,
+        )
+
+    return render_pages(page_states, render, max_workers)